@@ -2,8 +2,7 @@ from models import *
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
+import schedules
 
 
 THRESHOLD = 1
@@ -12,10 +11,12 @@ DURATION = 20
 STEP = 0.01
 CYCLES = int(DURATION / STEP) + 1
 
+TARGETS = schedules.piecewise((0, 0), (3, 300), (7, -200), (15, 0))
 
-def main():
 
-    f = Flywheel(0.01, 0, kin_fric=0.05)
+def simulate():
+
+    f = Flywheel(0.01, kin_fric=0.05)
     m = Motor(f, 556, 2.42)
     
     frames = [t * STEP for t in range(0, CYCLES)]
@@ -27,17 +28,10 @@ def main():
 
     _impulses = []
 
-    print(CYCLES)
-    
-    for t in frames:
-        if t < 3:
-            target = 0
-        elif t < 7:
-            target = 300
-        elif t < 15:
-            target = -200
-        else:
-            target = 0
+    schedule = schedules.tabulate(TARGETS, frames)[0]
+
+    for k, t in enumerate(frames):
+        target = schedule[k]
 
         if abs(f.vel - target) > THRESHOLD:
             if f.vel < target:
@@ -54,6 +48,16 @@ def main():
         powers.append(m.power)
         targets.append(target)
     
+    return frames, velocities, targets, powers, torques
+
+
+def main():
+    import matplotlib.pyplot as plt
+    from matplotlib import gridspec
+
+    frames, velocities, targets, powers, torques = simulate()
+    print(CYCLES)
+
     gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
 
     plt.subplots_adjust(hspace=0.4)
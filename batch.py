@@ -0,0 +1,261 @@
+from abc import ABC
+
+import numpy as np
+
+import control
+import metrics
+from models import EPSILON, FlywheelState, History, MotorState
+
+
+def _column(value, n):
+    return np.array(np.broadcast_to(np.asarray(value, dtype=float), (n,)))
+
+
+class FlywheelBatch:
+    """N independent flywheels stepped together. Same semantics as models.Flywheel."""
+
+    def __init__(self, n, mass, kin_fric=0, stat_fric=0):
+        self.n = n
+        self.mass = _column(mass, n)  # kg
+        self.kin_fric = _column(kin_fric, n)  # N*m
+        self.stat_fric = _column(stat_fric, n)  # N*m
+        self.pos = np.zeros(n)  # rad
+        self.vel = np.zeros(n)  # rad/s
+        self._impulses = np.zeros(n)  # N*m*s
+        self._torques = np.zeros(n)  # N*m
+
+        self.history = History(FlywheelState, shape=(n,))
+
+    @classmethod
+    def of(cls, flywheels):
+        flywheels = list(flywheels)
+        return cls(len(flywheels),
+                   [f.mass for f in flywheels],
+                   [f.kin_fric for f in flywheels],
+                   [f.stat_fric for f in flywheels])
+
+    @property
+    def is_moving(self):
+        return np.abs(self.vel) > EPSILON
+
+    def torque_step(self, dt):
+        moving = self.is_moving
+        torques = np.where(moving, self._torques - np.sign(self.vel) * self.kin_fric, self._torques)
+        torques[~moving & (np.abs(torques) < self.stat_fric)] = 0
+
+        impulse = self._impulses + torques * dt
+
+        self._impulses[:] = 0
+        self._torques[:] = 0
+        return impulse
+
+    def step(self, dt):
+        impulse = self.torque_step(dt)
+
+        acc = impulse / self.mass
+        self.vel += acc
+        self.pos += self.vel * dt
+
+        self.vel[~self.is_moving] = 0
+
+        self.history.append(self.pos, self.vel, acc)
+
+    @property
+    def velocities(self):
+        return self.history.column('vel')
+
+    @property
+    def positions(self):
+        return self.history.column('pos')
+
+    @property
+    def accelerations(self):
+        return self.history.column('acc')
+
+    def apply_impulse(self, impulse):
+        self._impulses += impulse
+
+    def apply_torque(self, torque):
+        self._torques += torque
+
+    def halt(self):
+        self.vel[:] = 0
+        self._impulses[:] = 0
+        self._torques[:] = 0
+
+
+class PIDBatch:
+    """N PID controllers with independent gains, updated with one vectorized call."""
+
+    def __init__(self, n, p, i=0, d=0, f=0):
+        self.n = n
+        self.p = _column(p, n)
+        self.i = _column(i, n)
+        self.d = _column(d, n)
+        self.f = _column(f, n)
+
+        self._sum = np.zeros(n)
+        self._last = np.zeros(n)
+
+    @classmethod
+    def of(cls, pids):
+        pids = list(pids)
+        return cls(len(pids),
+                   [c.p for c in pids],
+                   [c.i for c in pids],
+                   [c.d for c in pids],
+                   [c.f for c in pids])
+
+    @classmethod
+    def grid(cls, p, i=0, d=0, f=0):
+        """One controller for every combination of the given gain values."""
+        mesh = np.meshgrid(*(np.atleast_1d(g) for g in (p, i, d, f)), indexing='ij')
+        gains = [g.ravel() for g in mesh]
+        return cls(len(gains[0]), *gains)
+
+    def push_error(self, error, dt, feed=0):
+        de = (error - self._last) / dt
+        self._sum += error * dt
+        out = self.p * error + self.i * self._sum + self.d * de + self.f * feed
+        self._last = np.array(np.broadcast_to(error, (self.n,)), dtype=float)
+        return out
+
+
+class MotorBatch:
+    """N motors, each driving the flywheel at the same index of a FlywheelBatch."""
+
+    def __init__(self, flywheel, max_vel, stall_torque, deadzone=0):
+        assert isinstance(flywheel, FlywheelBatch), 'not a flywheel batch'
+        self.n = flywheel.n
+        self.flywheel = flywheel
+        self.max_vel = _column(max_vel, self.n)
+        self.stall_torque = _column(stall_torque, self.n)
+        self.deadzone = _column(deadzone, self.n)
+
+        self._power = np.zeros(self.n)
+
+        self.history = History(MotorState, shape=(self.n,))
+
+    @classmethod
+    def of(cls, flywheel, motors):
+        motors = list(motors)
+        return cls(flywheel,
+                   [m.max_vel for m in motors],
+                   [m.stall_torque for m in motors],
+                   [m.deadzone for m in motors])
+
+    @property
+    def power(self):
+        return self._power
+
+    @power.setter
+    def power(self, val):
+        self._power = np.clip(np.broadcast_to(np.asarray(val, dtype=float), (self.n,)), -1, 1)
+
+    def set_power_adj(self, val):
+        val = np.broadcast_to(np.asarray(val, dtype=float), (self.n,))
+        adj = np.copysign((1 - self.deadzone) * (np.abs(val) - 1) + 1, val)
+        self.power = np.where(np.abs(val) < EPSILON, 0, adj)
+
+    @property
+    def torque(self):
+        power = (1 - self.deadzone) * (np.abs(self.power) - 1) + 1
+        mag = np.maximum(0, np.abs(power) - np.abs(self.flywheel.vel) / self.max_vel) * self.stall_torque
+        return np.sign(self.power) * mag
+
+    @property
+    def powers(self):
+        return self.history.column('power')
+
+    @property
+    def torques(self):
+        return self.history.column('torque')
+
+    def step(self, dt):
+        torque = self.torque
+        self.history.append(self._power, torque)
+        self.flywheel.apply_torque(torque)
+
+
+class BatchSimulation(control.Simulation, ABC):
+    """
+    Steps N copies of a scenario at once. Each model holds one column per run and
+    every history is a (cycles, n) array, so a sweep costs about as much as a
+    single scalar run.
+    """
+
+    def __init__(self, n, duration, step=0.001, control_frequency=50):
+        super().__init__(duration, step, control_frequency)
+        self.n = n
+
+    def add_motor(self, motor):
+        assert isinstance(motor, MotorBatch), 'not a motor batch'
+        assert motor.n == self.n, 'motor batch has the wrong size'
+        self.motors.append(motor)
+        return motor
+
+    def add_flywheel(self, flywheel):
+        assert isinstance(flywheel, FlywheelBatch), 'not a flywheel batch'
+        assert flywheel.n == self.n, 'flywheel batch has the wrong size'
+        self.flywheels.append(flywheel)
+        return flywheel
+
+
+class BatchTargetedSimulation(BatchSimulation, ABC):
+    """
+    Batched counterpart of control.TargetedSimulation. get_target and get_derivative
+    may return a scalar shared by every run or an array with one value per run.
+    """
+
+    def __init__(self, n, duration, step=0.001, control_frequency=100):
+        super().__init__(n, duration, step, control_frequency)
+        self.target = np.zeros(n)
+        self.targets = np.empty((0, n))
+        self.derivative = np.zeros(n)
+        self.derivatives = np.empty((0, n))
+
+    def get_target(self, i, t, dt):
+        return 0
+
+    def get_derivative(self, i, t, dt):
+        return 0
+
+    def start(self):
+        self.targets = np.empty((self.cycles, self.n))
+        self.derivatives = np.empty((self.cycles, self.n))
+        super().start()
+
+    def raw_loop(self, i, t, dt):
+        self.target = self.targets[i] = self.get_target(i, t, dt)
+        self.derivative = self.derivatives[i] = self.get_derivative(i, t, dt)
+
+
+def main():
+
+    class _GainSweep(BatchTargetedSimulation):
+
+        def __init__(self):
+            self.pid = PIDBatch.grid(p=np.linspace(0.1, 1, 10), d=np.linspace(0, 0.5, 6))
+            super().__init__(self.pid.n, 20)
+            self.flywheel = FlywheelBatch(self.n, 0.01, kin_fric=0.01)
+            self.motor = MotorBatch(self.flywheel, 11, .65)
+
+        def get_target(self, i, t, dt):
+            return 6 if t >= 3 else 0
+
+        def init(self):
+            self.add_flywheel(self.flywheel)
+            self.add_motor(self.motor)
+
+        def loop(self, i, t, dt):
+            self.motor.power = self.pid.push_error(self.target - self.flywheel.pos, dt)
+
+    sim = _GainSweep()
+    sim.simulate()
+    error = metrics.iae(sim.frames, sim.targets, sim.flywheel.positions)
+    best = np.argmin(error)
+    print(f'Best of {sim.n}: P={sim.pid.p[best]}, D={sim.pid.d[best]}, IAE={error[best]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Headless benchmarks for every scenario and for the core step loop.
+
+    python bench.py --out results.json
+    python bench.py --baseline results.json
+
+Each benchmark reports steps per second (best of --repeat runs), the peak traced
+memory of one run, the bytes allocated per step while it runs (temporaries
+included, from tracemalloc's peak between steps) and the number of memory blocks
+per step still allocated for its results (histories and the like). Results are
+saved as JSON and can be compared against a stored baseline.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+import bangbangspeed
+import control
+import disturbedspeedpid
+import frictiontest
+import positionpid
+import quarticpositionpid
+import slowpositionpid
+import speedpid
+import splinepositionpid
+from models import Flywheel, Motor, PID
+
+
+@contextlib.contextmanager
+def _marking_steps(mark):
+    """Call mark() after every Flywheel.step, which every scenario makes once per step."""
+    if mark is None:
+        yield
+        return
+    step = Flywheel.step
+
+    def marked(self, dt):
+        step(self, dt)
+        mark()
+    Flywheel.step = marked
+    try:
+        yield
+    finally:
+        Flywheel.step = step
+
+
+def _scenario(cls):
+    def run(mark=None):
+        sim = cls()
+        with _marking_steps(mark):
+            sim.simulate()
+        return sim.cycles, sim
+    run.__name__ = cls.__name__
+    return run
+
+
+def _script(module):
+    def run(mark=None):
+        with _marking_steps(mark):
+            return module.CYCLES, module.simulate()
+    run.__name__ = module.__name__
+    return run
+
+
+SCENARIOS = {
+    'positionpid': _scenario(positionpid.PositionSimulation),
+    'quarticpositionpid': _scenario(quarticpositionpid.QuarticPositionSimulation),
+    'splinepositionpid': _scenario(splinepositionpid.SplinePositionSimulation),
+    'disturbedspeedpid': _scenario(disturbedspeedpid.DisturbedSpeedSimulation),
+    'frictiontest': _scenario(frictiontest.FrictionTest),
+    'speedpid': _script(speedpid),
+    'bangbangspeed': _script(bangbangspeed),
+    'slowpositionpid': _script(slowpositionpid),
+}
+
+MICRO_CALLS = 100000
+
+
+def _micro(name, setup):
+    def run(mark=None):
+        call = setup()
+        if mark is None:
+            for _ in range(MICRO_CALLS):
+                call()
+        else:
+            for _ in range(MICRO_CALLS):
+                call()
+                mark()
+        return MICRO_CALLS, call
+    run.__name__ = name
+    return run
+
+
+def _flywheel_step():
+    f = Flywheel(0.01, kin_fric=0.01, stat_fric=0.02)
+    return lambda: (f.apply_torque(0.05), f.step(0.001))
+
+
+def _motor_torque():
+    m = Motor(Flywheel(0.01), 11, .65, deadzone=0.1)
+    m.power = 0.5
+    m.flywheel.vel = 3
+    return lambda: m.torque
+
+
+def _pid_push_error():
+    p = PID(0.6, 1, 0.8, 0.15)
+    return lambda: p.push_error(0.5, 0.01, 0.1)
+
+
+class _IdleSimulation(control.Simulation):
+
+    def __init__(self):
+        super().__init__(MICRO_CALLS * 0.001)
+        self.flywheel = Flywheel(0.01, kin_fric=0.01)
+        self.motor = Motor(self.flywheel, 11, .65)
+
+    def init(self):
+        self.add_flywheel(self.flywheel)
+        self.add_motor(self.motor)
+
+    def loop(self, i, t, dt):
+        self.motor.power = 0.5
+
+
+def _simulation_loop(mark=None):
+    sim = _IdleSimulation()
+    with _marking_steps(mark):
+        sim.simulate()
+    return sim.cycles, sim
+
+
+MICRO = {
+    'Flywheel.step': _micro('Flywheel.step', _flywheel_step),
+    'Motor.torque': _micro('Motor.torque', _motor_torque),
+    'PID.push_error': _micro('PID.push_error', _pid_push_error),
+    'Simulation.simulate': _simulation_loop,
+}
+
+BENCHMARKS = dict(SCENARIOS, **MICRO)
+
+
+class _Allocations:
+    """
+    Bytes allocated between marks: the traced peak since the last mark, less what
+    was live at it. Temporaries freed within a step still raise the peak.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.marks = 0
+        self._reading = tracemalloc.get_traced_memory()
+        # What marking itself leaves live, measured with nothing in between
+        for _ in range(1000):
+            self.mark()
+        self._overhead = self.bytes / self.marks
+        self.bytes = 0
+        self.marks = 0
+
+    @property
+    def per_mark(self):
+        return max(0, self.bytes / max(self.marks, 1) - self._overhead)
+
+    def mark(self):
+        reading = tracemalloc.get_traced_memory()
+        self.bytes += reading[1] - self._reading[0]
+        self.marks += 1
+        # Free everything before resetting the peak, so that nothing freed later hides a temporary
+        self._reading = None
+        del reading
+        tracemalloc.reset_peak()
+        self._reading = tracemalloc.get_traced_memory()
+
+
+def measure(run, repeat=3):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        steps, result = run()
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del result
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    _, result = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    # Blocks still held by the run's results, e.g. one object per history row
+    retained = sys.getallocatedblocks() - blocks
+    del result
+
+    tracemalloc.start()
+    allocations = _Allocations()
+    _, result = run(allocations.mark)
+    tracemalloc.stop()
+    del result
+
+    return {
+        'steps': steps,
+        'seconds': best,
+        'steps_per_second': steps / best,
+        'peak_bytes': peak,
+        'allocated_bytes_per_step': allocations.per_mark,
+        'retained_blocks_per_step': retained / steps,
+    }
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Lines describing each benchmark's speed relative to the baseline."""
+    lines = []
+    for name, r in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            lines.append(f'{name:24} new')
+            continue
+        ratio = r['steps_per_second'] / old['steps_per_second']
+        flag = 'SLOWER' if ratio < 1 - tolerance else 'faster' if ratio > 1 + tolerance else ''
+        lines.append(f'{name:24} {ratio:6.2f}x {flag}')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help=f'benchmarks to run (default: all of {", ".join(BENCHMARKS)})')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved earlier')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+
+    results = {}
+    print(f'{"benchmark":24} {"steps/s":>12} {"peak KiB":>10} {"bytes/step":>11} {"retained/step":>14}')
+    for name in names:
+        r = results[name] = measure(BENCHMARKS[name], args.repeat)
+        print(f'{name:24} {r["steps_per_second"]:12.0f} {r["peak_bytes"] / 1024:10.0f} '
+              f'{r["allocated_bytes_per_step"]:11.1f} {r["retained_blocks_per_step"]:14.3f}')
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        print('\n'.join(compare(results, baseline, args.tolerance)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Shared-memory bridge between a simulation and a controller in another process.
+
+The simulation publishes one sensor row per control tick (tick, time, target
+and every flywheel's position and velocity) and waits for the command row with
+the same tick (every motor's power). Each direction is a single-producer,
+single-consumer ring buffer in one multiprocessing.shared_memory block, so
+nothing is pickled or copied through the kernel; a tick costs a few memory
+writes and a short spin. Requires Python 3.8+ for multiprocessing.shared_memory.
+
+The rings rely on each row being written before its head counter is advanced,
+which holds on x86's memory model; weaker architectures would need fences that
+pure Python cannot issue.
+"""
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+import os
+import time
+
+import numpy as np
+
+MAGIC = 0x464C5957  # 'FLYW'
+HEADER = 8  # int64 fields: magic, flywheels, motors, slots, done
+LINE = 8  # int64 per cache line, to keep the two counters of a ring apart
+
+Sensors = namedtuple('Sensors', ('tick', 't', 'target', 'pos', 'vel'))
+
+_yield = getattr(os, 'sched_yield', lambda: time.sleep(0))
+
+
+def open_shared(name):
+    """Attach to a shared memory block that another process created and will unlink."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before 3.13 every attaching process registers the block and would unlink it on exit
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def release_shared(shm):
+    """Close and unlink a block this process created."""
+    shm.close()
+    # An attached process sharing this resource tracker may have unregistered the block
+    resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+class RingBuffer:
+    """Fixed-size rows of float64 in shared memory, one writer and one reader."""
+
+    def __init__(self, buf, offset, slots, width):
+        self.slots = slots
+        self.width = width
+        self._head = np.ndarray((1,), np.int64, buf, offset)
+        self._tail = np.ndarray((1,), np.int64, buf, offset + LINE * 8)
+        self._rows = np.ndarray((slots, width), np.float64, buf, offset + 2 * LINE * 8)
+
+    @staticmethod
+    def size(slots, width):
+        return 2 * LINE * 8 + slots * width * 8
+
+    def push(self, row):
+        head = int(self._head[0])
+        if head - int(self._tail[0]) >= self.slots:
+            return False
+        self._rows[head % self.slots] = row
+        self._head[0] = head + 1
+        return True
+
+    def pop(self):
+        """The oldest row (a copy), or None if the ring is empty."""
+        tail = int(self._tail[0])
+        if tail == int(self._head[0]):
+            return None
+        row = self._rows[tail % self.slots].copy()
+        self._tail[0] = tail + 1
+        return row
+
+
+class Bridge:
+    """
+    The shared block and its two rings. Create it on the simulation side with
+    Bridge.create and open it from the controller with Bridge.attach(name).
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((HEADER,), np.int64, shm.buf)
+        assert header[0] == MAGIC, 'not a simulation bridge'
+        self._header = header
+        self.flywheels, self.motors, self.slots = (int(v) for v in header[1:4])
+        offset = HEADER * 8
+        self.sensors = RingBuffer(shm.buf, offset, self.slots, 3 + 2 * self.flywheels)
+        offset += RingBuffer.size(self.slots, 3 + 2 * self.flywheels)
+        self.commands = RingBuffer(shm.buf, offset, self.slots, 1 + self.motors)
+
+    @classmethod
+    def create(cls, flywheels=1, motors=1, slots=16, name=None):
+        size = (HEADER * 8 + RingBuffer.size(slots, 3 + 2 * flywheels) + RingBuffer.size(slots, 1 + motors))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER,), np.int64, shm.buf)
+        header[:] = 0
+        header[:4] = (MAGIC, flywheels, motors, slots)
+        np.ndarray((size - HEADER * 8,), np.uint8, shm.buf, HEADER * 8)[:] = 0
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(open_shared(name), owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def done(self):
+        return bool(self._header[4])
+
+    def finish(self):
+        """Tell the controller that no more ticks will come."""
+        self._header[4] = 1
+
+    def close(self):
+        self._header = self.sensors = self.commands = None
+        if self.owner:
+            release_shared(self.shm)
+        else:
+            self.shm.close()
+
+    # Controller side
+
+    def read(self, timeout=None):
+        """The next Sensors, or None once the simulation has finished."""
+        row = _wait(self.sensors.pop, timeout, lambda: self.done)
+        if row is None:
+            return None
+        n = self.flywheels
+        return Sensors(int(row[0]), row[1], row[2], row[3:3 + n], row[3 + n:])
+
+    def write(self, tick, powers):
+        row = np.empty(1 + self.motors)
+        row[0] = tick
+        row[1:] = powers
+        while not self.commands.push(row):
+            _yield()
+
+
+def _wait(pop, timeout, stop=None, spins=1000):
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    count = 0
+    while True:
+        row = pop()
+        if row is not None:
+            return row
+        if stop is not None and stop():
+            return None
+        count += 1
+        if count > spins:
+            # Give the other process the CPU when it is not on its own core
+            _yield()
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError('no reply through the bridge')
+
+
+def serve(sim, bridge, timeout=5.0):
+    """
+    Run sim with its loop replaced by the external controller on the other end of
+    bridge. Every control tick publishes the sensors, then blocks until the
+    controller answers with that tick's motor powers.
+    """
+    row = np.empty(3 + 2 * bridge.flywheels)
+    n = bridge.flywheels
+
+    def loop(i, t, dt):
+        assert len(sim.flywheels) == n and len(sim.motors) == bridge.motors, 'bridge has the wrong shape'
+        row[0] = i
+        row[1] = t
+        row[2] = getattr(sim, 'target', np.nan)
+        for k, f in enumerate(sim.flywheels):
+            row[3 + k] = f.pos
+            row[3 + n + k] = f.vel
+        while not bridge.sensors.push(row):
+            _yield()
+        command = _wait(bridge.commands.pop, timeout)
+        assert int(command[0]) == int(i), 'controller answered the wrong tick'
+        for m, power in zip(sim.motors, command[1:]):
+            m.power = power
+
+    sim.loop = loop
+    try:
+        sim.simulate()
+    finally:
+        del sim.loop
+        bridge.finish()
+
+
+def _pid_controller(name, p):
+    """An external velocity controller, as another process would run it."""
+    from models import PID
+
+    bridge = Bridge.attach(name)
+    pid = PID(p)
+    try:
+        while True:
+            sensors = bridge.read()
+            if sensors is None:
+                break
+            bridge.write(sensors.tick, pid.push_error(sensors.target - sensors.vel[0], 0.001))
+    finally:
+        bridge.close()
+
+
+def main():
+    from multiprocessing import Process
+    from disturbedspeedpid import DisturbedSpeedSimulation
+
+    sim = DisturbedSpeedSimulation()
+    bridge = Bridge.create(flywheels=1, motors=1)
+    controller = Process(target=_pid_controller, args=(bridge.name, sim.pid.p))
+    controller.start()
+    try:
+        start = time.perf_counter()
+        serve(sim, bridge)
+        elapsed = time.perf_counter() - start
+    finally:
+        controller.join()
+        bridge.close()
+
+    ticks = sim.cycles // sim.steps_per_control + 1
+    print(f'{ticks} ticks closed through shared memory in {elapsed:.3f} s')
+    print(f'final velocity {sim.flywheel.vel:.3f} (target {sim.target})')
+
+    local = DisturbedSpeedSimulation()
+    local.simulate()
+    print('matches the in-process controller:', np.array_equal(local.flywheel.velocities, sim.flywheel.velocities))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import hashlib
+import inspect
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+
+from models import History
+
+# Simulation attributes that do not affect results
+_IGNORED = {'cache', 'recorder', 'profiler', 'cursor', 'offset', '_prepared', '_frames', '_control_frames', '_precomputed'}
+
+
+class ResultCache:
+    """
+    Content-addressed store of simulation results. Assign one to
+    Simulation.cache and simulate() loads the histories of an identical earlier
+    run instead of stepping the models.
+
+    A run is identified by the class, every attribute of the simulation before it
+    starts (durations, step, control frequency, model parameters, gains...) and the
+    source of every module those objects come from, so editing a model invalidates
+    its results. Histories are stored as uncompressed .npz files; once the cache
+    holds more than max_bytes the least recently used entries are removed.
+
+    Only histories, the final model states and list or array attributes of the
+    simulation itself (e.g. values collected during the run) are restored. Controller state
+    such as PID sums is left as it was before the run.
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sim):
+        digest = hashlib.sha256()
+        modules = set()
+        _fingerprint(sim, digest, modules, {}, ignore=_IGNORED)
+        for name in sorted(modules):
+            digest.update(name.encode())
+            digest.update(_source(name))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, sim, key):
+        """Fill a fresh run of sim from the cache. Returns whether the key was found."""
+        path = self._path(key)
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return False
+        with data:
+            sim.start()
+            for name, model in _models(sim):
+                for attr, history in _histories(model):
+                    prefix = f'{name}.{attr}.'
+                    history.clear()
+                    history.extend(*(data[prefix + f] for f in history.row_type._fields))
+                _restore_state(model)
+            for attr in _list_attributes(sim):
+                stored = data['sim.' + attr]
+                setattr(sim, attr, stored.tolist() if isinstance(getattr(sim, attr), list) else stored)
+            sim.cursor = sim.cycles
+            sim.finish()
+        os.utime(path)
+        self.hits += 1
+        return True
+
+    def store(self, sim, key):
+        arrays = {}
+        for name, model in _models(sim):
+            for attr, history in _histories(model):
+                for field in history.row_type._fields:
+                    arrays[f'{name}.{attr}.{field}'] = history.column(field)
+        for attr in _list_attributes(sim):
+            arrays['sim.' + attr] = np.asarray(getattr(sim, attr))
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, name))
+
+
+def _models(sim):
+    for k, f in enumerate(sim.flywheels):
+        yield f'flywheel{k}', f
+    for k, m in enumerate(sim.motors):
+        yield f'motor{k}', m
+    if getattr(sim, '_precomputed', True) is None:
+        yield 'sim', sim
+
+
+def _histories(obj):
+    return [(attr, value) for attr, value in sorted(vars(obj).items()) if isinstance(value, History)]
+
+
+def _restore_state(model):
+    """Set the plain state attributes of a model to the last row of its history."""
+    state = vars(model)
+    for attr, history in _histories(model):
+        if len(history) == 0:
+            continue
+        last = history[-1]
+        for field in ('pos', 'vel'):
+            if field in last._fields and field in state:
+                state[field] = last._asdict()[field]
+        if 'power' in last._fields and '_power' in state:
+            state['_power'] = last.power
+
+
+def _list_attributes(sim):
+    """Numeric list and array attributes of the simulation, which may be filled during a run."""
+    names = []
+    for attr, value in sorted(vars(sim).items()):
+        if attr in _IGNORED or attr in ('flywheels', 'motors'):
+            continue
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+            names.append(attr)
+        elif isinstance(value, list) and all(isinstance(v, (int, float)) for v in value):
+            names.append(attr)
+    return names
+
+
+def _fingerprint(obj, digest, modules, seen, ignore=()):
+    """Feed a deterministic description of obj to digest, noting the modules of its classes."""
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        digest.update(repr((type(obj).__name__, obj)).encode())
+        return
+    if id(obj) in seen:
+        digest.update(f'<ref {seen[id(obj)][0]}>'.encode())
+        return
+    # Holding obj keeps temporaries (state dicts, column views) alive, so their ids are not reused
+    seen[id(obj)] = (len(seen), obj)
+
+    if isinstance(obj, np.generic):
+        digest.update(repr((obj.dtype.str, obj.item())).encode())
+    elif isinstance(obj, np.ndarray):
+        digest.update(repr((obj.dtype.str, obj.shape)).encode())
+        digest.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, History):
+        digest.update(repr(('History', obj.row_type._fields, obj.shape, len(obj))).encode())
+        for field in obj.row_type._fields:
+            _fingerprint(obj.column(field), digest, modules, seen)
+    elif isinstance(obj, (list, tuple)):
+        digest.update(f'{type(obj).__name__}[{len(obj)}]'.encode())
+        for item in obj:
+            _fingerprint(item, digest, modules, seen)
+    elif isinstance(obj, dict):
+        digest.update(f'dict[{len(obj)}]'.encode())
+        for k, v in sorted(obj.items(), key=lambda item: repr(item[0])):
+            _fingerprint(k, digest, modules, seen)
+            _fingerprint(v, digest, modules, seen)
+    elif isinstance(obj, types.ModuleType):
+        modules.add(obj.__name__)
+        digest.update(f'<module {obj.__name__}>'.encode())
+    elif isinstance(obj, (types.FunctionType, types.MethodType, type)):
+        fn = getattr(obj, '__func__', obj)
+        modules.add(fn.__module__)
+        digest.update(f'{fn.__module__}.{fn.__qualname__}'.encode())
+        if isinstance(obj, types.MethodType):
+            _fingerprint(obj.__self__, digest, modules, seen)
+        for cell in getattr(fn, '__closure__', None) or ():
+            _fingerprint(cell.cell_contents, digest, modules, seen)
+    else:
+        cls = type(obj)
+        for base in cls.__mro__:
+            modules.add(base.__module__)
+        digest.update(f'{cls.__module__}.{cls.__qualname__}'.encode())
+        state = {k: v for k, v in getattr(obj, '__dict__', {}).items() if k not in ignore}
+        _fingerprint(state, digest, modules, seen)
+
+
+def _source(module_name):
+    module = sys.modules.get(module_name)
+    if module is None or module_name == 'builtins':
+        return b''
+    try:
+        path = inspect.getsourcefile(module)
+    except TypeError:
+        return b''
+    if path is None or not os.path.isfile(path):
+        return b''
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    import time
+    from disturbedspeedpid import DisturbedSpeedSimulation
+
+    cache = ResultCache(os.path.join(tempfile.gettempdir(), 'flywheel-cache'))
+    for _ in range(2):
+        sim = DisturbedSpeedSimulation()
+        sim.cache = cache
+        start = time.perf_counter()
+        sim.simulate()
+        print(f'{time.perf_counter() - start:.4f} s, final velocity {sim.flywheel.vel:.3f}')
+    print(f'{cache.hits} hit(s), {cache.misses} miss(es)')
+
+
+if __name__ == '__main__':
+    main()
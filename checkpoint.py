@@ -0,0 +1,106 @@
+from concurrent.futures import ProcessPoolExecutor
+import copy
+from functools import partial
+import os
+import pickle
+
+import schedules
+from integrators import IntervalIntegrator
+
+
+class Checkpoint:
+    """
+    The full state of a started simulation at one step: models, controller state
+    (PIDs and anything else held on the simulation), targets, the integrator and
+    every history up to the cursor. Branches forked from it only compute the
+    remaining steps.
+    """
+
+    def __init__(self, sim):
+        assert sim.recorder is None, 'recorded simulations cannot be checkpointed'
+        assert sim.profiler is None, 'profiled simulations cannot be checkpointed'
+        # Interval integrators solve whole control periods; splitting one would change the branches
+        assert not isinstance(sim.integrator, IntervalIntegrator) or sim.cursor % sim.steps_per_control == 0, \
+            'simulations with an interval integrator can only be checkpointed on a control tick'
+        self.cursor = sim.cursor
+        self.time = sim.cursor * sim.step
+        self._sim = copy.deepcopy(sim)
+
+    def restore(self):
+        """An independent copy of the simulation, positioned at the checkpoint."""
+        return copy.deepcopy(self._sim)
+
+    def fork(self, variant=None):
+        """
+        Restore, let `variant(sim)` change it (gains, disturbances, targets...) and
+        run it to the end.
+        """
+        sim = self.restore()
+        if variant is not None:
+            variant(sim)
+        sim.resume()
+        return sim
+
+    def fork_many(self, variants, reduce=None, processes=1):
+        """
+        fork() once per variant. With processes > 1 the branches run in a process
+        pool, which needs the simulation and the variants to be picklable; each
+        worker unpickles the checkpoint once. `reduce(sim)` maps every finished
+        branch to what is returned, to avoid sending whole histories back.
+        """
+        variants = list(variants)
+        processes = min(processes or os.cpu_count() or 1, len(variants))
+        if processes <= 1:
+            return [_finish(self.fork(v), reduce) for v in variants]
+        with ProcessPoolExecutor(processes, initializer=_load, initargs=(pickle.dumps(self),)) as pool:
+            return list(pool.map(_fork, variants, [reduce] * len(variants)))
+
+
+def checkpoint(sim, t):
+    """
+    Start sim, run it up to time t and checkpoint it there. With an interval
+    integrator the checkpoint is taken on the last control tick at or before t.
+    """
+    sim.start()
+    stop = min(int(round(t / sim.step)), sim.cycles)
+    if isinstance(sim.integrator, IntervalIntegrator):
+        stop -= stop % sim.steps_per_control
+    sim.advance(stop)
+    return Checkpoint(sim)
+
+
+def _finish(sim, reduce):
+    return sim if reduce is None else reduce(sim)
+
+
+# The checkpoint a worker process forks from
+_loaded = None
+
+
+def _load(data):
+    global _loaded
+    _loaded = pickle.loads(data)
+
+
+def _fork(variant, reduce):
+    return _finish(_loaded.fork(variant), reduce)
+
+
+def _scale_disturbance(factor, sim):
+    # Module level, so that variants made with functools.partial can be pickled
+    sim.disturbance = schedules.scale(factor, sim.disturbance)
+
+
+def main():
+    from disturbedspeedpid import DisturbedSpeedSimulation
+    from tuner import velocity_iae
+
+    # Everything up to t=5 s is shared; only the disturbances after it differ
+    base = checkpoint(DisturbedSpeedSimulation(), 5)
+    scales = (0.5, 1, 1.5, 2)
+    for scale, iae in zip(scales, base.fork_many([partial(_scale_disturbance, s) for s in scales], velocity_iae)):
+        print(f'disturbance x{scale}: velocity IAE {iae:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,66 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from integrators import EulerIntegrator
 from models import *
 
 
 class Simulation(ABC):
 
-    def __init__(self, duration, step=0.001, control_frequency=50):
+    def __init__(self, duration, step=0.001, control_frequency=50, integrator=None):
         self.step = step
         self.duration = duration
         self.control_frequency = control_frequency
         
-        self.cycles = int(duration / step) + 1
-        self.steps_per_control = int(1 / control_frequency / step)
+        self.integrator = integrator or EulerIntegrator()
+        self.set_timing()
 
-        self._frames = None
         self.motors = []
         self.flywheels = []
+        self.recorder = None
+        self.profiler = None
+        self.cache = None
+        self.cursor = 0
+        self.offset = 0
+        self._prepared = 0
+
+    def set_timing(self, duration=None, step=None, control_frequency=None):
+        """
+        Change the duration, physics step or control frequency of the next run.
+        Raises ValueError, leaving the timing unchanged, if a control period
+        would be shorter than one physics step.
+        """
+        duration = self.duration if duration is None else duration
+        step = self.step if step is None else step
+        control_frequency = self.control_frequency if control_frequency is None else control_frequency
+        steps_per_control = int(1 / control_frequency / step)
+        if steps_per_control < 1:
+            raise ValueError(f'control frequency {control_frequency:g} Hz is faster than the physics '
+                             f'step of {step:g} s (at most {1 / step:g} Hz)')
+        self.duration = duration
+        self.step = step
+        self.control_frequency = control_frequency
+        self.cycles = int(self.duration / self.step) + 1
+        self.steps_per_control = steps_per_control
+        self._frames = None
+        self._control_frames = None
 
     @property
     def frames(self):
         if self._frames is None:
-            self._frames = [t * self.step for t in range(0, self.cycles)]
+            self._frames = np.arange(self.cycles) * self.step
         return self._frames
 
+    def frames_between(self, start, stop):
+        """The times of steps start to stop - 1, without building the whole frames array."""
+        return np.arange(start, stop) * self.step
+
     @property
     def control_frames(self):
-        if self._frames is None:
-            self._frames = [t * self.step * self.steps_per_control for t in range(0, self.cycles)]
-        return self._frames
+        if self._control_frames is None:
+            self._control_frames = np.arange(self.cycles) * (self.step * self.steps_per_control)
+        return self._control_frames
 
     @abstractmethod
     def init(self):
@@ -40,6 +73,26 @@ class Simulation(ABC):
     def raw_loop(self, i, t, dt):
         pass
 
+    @property
+    def window(self):
+        """
+        Steps of per-step inputs (targets, disturbances...) held in memory at once
+        while a recorder streams the run, or None to hold a whole run's.
+        """
+        return getattr(self.recorder, 'window', None)
+
+    def prepare(self, start, stop):
+        """
+        Compute per-step inputs for steps start to stop - 1, before they run. Index
+        them with i - self.offset; self.offset is start.
+        """
+        pass
+
+    @property
+    def per_step_raw_loop(self):
+        """Whether raw_loop has to run every physics step rather than only on control ticks."""
+        return type(self).raw_loop is not Simulation.raw_loop
+
     def add_motor(self, motor):
         assert isinstance(motor, Motor), 'not a motor'
         self.motors.append(motor)
@@ -50,41 +103,170 @@ class Simulation(ABC):
         self.flywheels.append(flywheel)
         return flywheel
 
-    def simulate(self):
+    def reserve(self):
+        """Preallocate every history for a full run."""
+        for f in self.flywheels:
+            f.history.reserve(self.cycles)
+        for m in self.motors:
+            m.history.reserve(self.cycles)
+
+    def start(self):
+        """Set up a fresh run. simulate() is start(), advance() and finish()."""
         self.flywheels = []
         self.motors = []
+        self.integrator.reset()
         self.init()
-        for i, t in enumerate(self.frames):
-            self.raw_loop(i, t, self.step)
-            if i % self.steps_per_control == 0:
-                self.loop(i / self.steps_per_control, t, self.step * self.steps_per_control)
-            for f in self.flywheels:
-                f.step(self.step)
-            for m in self.motors:
-                m.step(self.step)
+        if self.recorder is not None:
+            self.recorder.attach(self)
+        self.reserve()
+        self.cursor = 0
+        self._prepare()
+        # Last, so that nothing left to fail in start() can leave methods patched
+        if self.profiler is not None:
+            self.profiler.attach(self)
+
+    def _prepare(self):
+        window = self.window or self.cycles
+        if window < self.cycles:
+            # Whole control periods, so interval integrators never solve a period in two pieces
+            k = self.steps_per_control
+            window = max(k, window // k * k)
+        self.offset = self.cursor
+        self._prepared = min(self.cursor + window, self.cycles)
+        self.prepare(self.offset, self._prepared)
+
+    def advance(self, stop=None):
+        """Run the steps from the cursor up to (not including) step `stop`, by default to the end."""
+        stop = self.cycles if stop is None else stop
+        assert self.cursor <= stop <= self.cycles, 'cannot advance backwards or past the end'
+        while self.cursor < stop:
+            if self.cursor == self._prepared:
+                self._prepare()
+            end = min(stop, self._prepared)
+            self.integrator.run(self, self.cursor, end)
+            self.cursor = end
+
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.detach(self)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def resume(self):
+        """Run the rest of a started simulation, e.g. one restored from a checkpoint."""
+        self.advance()
+        self.finish()
+
+    def simulate(self):
+        # Recorded or profiled runs always step the models
+        cached = self.cache is not None and self.recorder is None and self.profiler is None
+        if cached:
+            key = self.cache.key(self)
+            if self.cache.load(self, key):
+                return
+        self.start()
+        try:
+            self.advance()
+        finally:
+            # Also closes a recorder, so what was recorded stays readable after an error
+            self.finish()
+        if cached:
+            self.cache.store(self, key)
 
 
 class TargetedSimulation(Simulation, ABC):
 
-    def __init__(self, duration, step=0.001, control_frequency=100):
-        super().__init__(duration, step, control_frequency)
+    # The flywheel state the target is for: 'pos' or 'vel'
+    tracks = 'pos'
+
+    def __init__(self, duration, step=0.001, control_frequency=100, integrator=None):
+        cls = type(self)
+        if cls.get_target is TargetedSimulation.get_target and cls.get_targets is TargetedSimulation.get_targets:
+            raise TypeError(f"Can't instantiate {cls.__name__} without get_target or get_targets")
+        super().__init__(duration, step, control_frequency, integrator)
         self.target = 0
-        self.targets = []
         self.derivative = 0
-        self.derivatives = []
+        self.target_history = History(TargetState)
+        self._precomputed = None
+
+    @property
+    def targets(self):
+        if self._precomputed is not None and self.recorder is None:
+            return self._precomputed[0]
+        return self.target_history.column('target')
+
+    @property
+    def derivatives(self):
+        if self._precomputed is not None and self.recorder is None:
+            return self._precomputed[1]
+        return self.target_history.column('derivative')
 
-    @abstractmethod
     def get_target(self, i, t, dt):
-        pass
+        """Target at one step. Subclasses implement this or get_targets."""
+        raise NotImplementedError
 
     def get_derivative(self, i, t, dt):
         return 0
 
+    def get_targets(self, frames):
+        """
+        Vectorized alternative to get_target, for targets that depend only on time.
+        Return an array with one target per frame to have the targets computed
+        ahead of the loop, or None to call get_target at every step.
+        """
+        return None
+
+    def get_derivatives(self, frames):
+        """Vectorized get_derivative, used together with get_targets."""
+        return np.zeros_like(frames)
+
+    def _precompute(self, start, stop):
+        frames = self.frames_between(start, stop)
+        targets = self.get_targets(frames)
+        if targets is None:
+            return None
+        shape = (stop - start,)
+        return (np.broadcast_to(np.asarray(targets, dtype=float), shape),
+                np.broadcast_to(np.asarray(self.get_derivatives(frames), dtype=float), shape))
+
+    def prepare(self, start, stop):
+        super().prepare(start, stop)
+        self._precomputed = self._precompute(start, stop)
+        # A recorder keeps the targets with the rest of the run
+        if self._precomputed is not None and self.recorder is not None:
+            self.target_history.extend(*self._precomputed)
+
+    def resume(self):
+        # Targets may have been changed since start(); only the remaining steps follow the change
+        if self._precomputed is not None:
+            fresh = self._precompute(self.cursor, self._prepared)
+            if fresh is not None:
+                spliced = []
+                for old, new in zip(self._precomputed, fresh):
+                    column = np.array(old)
+                    column[self.cursor - self.offset:] = new
+                    spliced.append(column)
+                self._precomputed = tuple(spliced)
+        super().resume()
+
+    def reserve(self):
+        super().reserve()
+        if type(self).get_targets is TargetedSimulation.get_targets:
+            self.target_history.reserve(self.cycles)
+
+    @property
+    def per_step_raw_loop(self):
+        return self._precomputed is None or type(self).raw_loop is not TargetedSimulation.raw_loop
+
     def raw_loop(self, i, t, dt):
+        if self._precomputed is not None:
+            j = i - self.offset
+            self.target = self._precomputed[0][j]
+            self.derivative = self._precomputed[1][j]
+            return
         self.target = self.get_target(i, t, dt)
-        self.targets.append(self.target)
         self.derivative = self.get_derivative(i, t, dt)
-        self.derivatives.append(self.derivative)
+        self.target_history.append(self.target, self.derivative)
 
 
 def main():
@@ -92,7 +274,7 @@ def main():
     class _ExampleSimulation(Simulation):
 
         def __init__(self):
-            super().__init__(0.001, 20, 60)
+            super().__init__(20, 0.001, 60)
             self.flywheel = Flywheel(0.01, kin_fric=0.01)
             self.motor = Motor(self.flywheel, 11, .65)
             
@@ -1,23 +1,28 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib import gridspec
 
 import control
+import schedules
 from models import *
 
 DURATION = 20
 STEP = 0.001
 CYCLES = int(DURATION / STEP) + 1
 
+DISTURBANCES = schedules.piecewise((0, 0), (2, 0.5), (5, -1.5), (8, -2.1), (14, 0), (15, -4), (15.5, 0))
+
 
 class DisturbedSpeedSimulation(control.TargetedSimulation):
 
+    tracks = 'vel'
+
     def __init__(self):
         super().__init__(20, control_frequency=100)
         self.flywheel = Flywheel(0.01, kin_fric=0.01, stat_fric=0.02)
         self.motor = Motor(self.flywheel, 556, 2.42)
         self.pid = PID(1)
-        self.disturbances = []
+        self.disturbance = DISTURBANCES
+        self._disturbance = None
+        self._applied = []  # (first step, schedule) of every disturbance schedule the run used
 
     def get_target(self, i, t, dt):
         return 100
@@ -27,38 +32,50 @@ class DisturbedSpeedSimulation(control.TargetedSimulation):
         self.add_flywheel(self.flywheel)
 
     def loop(self, i, t, dt):
-        self.motor.power = self.pid.push_error(self.target - self.flywheel.vel, STEP)
+        self.motor.power = self.pid.push_error(self.target - self.flywheel.vel, self.step)
+
+    @property
+    def disturbances(self):
+        """The external torque applied at every step run so far."""
+        values = np.empty(self.cursor)
+        ends = [first for first, _ in self._applied[1:]] + [self.cursor]
+        for (first, schedule), end in zip(self._applied, ends):
+            values[first:end] = schedules.tabulate(schedule, self.frames_between(first, end))[0]
+        return values
+
+    def start(self):
+        self._applied = [(0, self.disturbance)]
+        super().start()
+
+    def prepare(self, start, stop):
+        super().prepare(start, stop)
+        self._disturbance = schedules.tabulate(self.disturbance, self.frames_between(start, stop))[0]
+
+    def resume(self):
+        if self.disturbance != self._applied[-1][1]:
+            self._applied.append((self.cursor, self.disturbance))
+            self._disturbance = np.array(self._disturbance)
+            fresh = schedules.tabulate(self.disturbance, self.frames_between(self.cursor, self._prepared))[0]
+            self._disturbance[self.cursor - self.offset:] = fresh
+        super().resume()
 
     def raw_loop(self, i, t, dt):
         super().raw_loop(i, t, dt)
-        if t < 2:
-            disturb = 0
-        elif t < 5:
-            disturb = 0.5
-        elif t < 8:
-            disturb = -1.5
-        elif t < 14:
-            disturb = -2.1
-        elif t < 15:
-            disturb = 0
-        elif t < 15.5:
-            disturb = -4
-        else:
-            disturb = 0
-        self.flywheel.apply_torque(disturb)
-        self.disturbances.append(disturb)
+        self.flywheel.apply_torque(self._disturbance[i - self.offset])
 
 
 def main():
+    import matplotlib.pyplot as plt
+    from matplotlib import gridspec
 
     sim = DisturbedSpeedSimulation()
     sim.simulate()
 
     frames = sim.frames
-    velocities = list(sim.flywheel.velocities)
+    velocities = sim.flywheel.velocities
     targets = sim.targets
-    powers = list(sim.motor.powers)
-    torques = list(sim.motor.torques)
+    powers = sim.motor.powers
+    torques = sim.motor.torques
     disturbances = sim.disturbances
 
     gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
@@ -0,0 +1,223 @@
+import numpy as np
+
+import control
+from integrators import EulerIntegrator
+from models import EPSILON, FlywheelState, History, MotorState
+
+
+class Drivetrain:
+    """
+    Many flywheels ("bodies") and motors joined by rigid couplings with gear ratios.
+    Every group of coupled bodies moves as one degree of freedom, so the whole
+    system reduces to
+
+        body velocities = G @ dof velocities,  inertia = G.T @ diag(mass) @ G
+
+    and each step is a handful of array operations, however many motors and
+    bodies there are. Friction, stiction, deadzone and power clamping follow
+    models.Flywheel and models.Motor, reflected through the gear ratios, and so
+    does their timing: motor torque is computed from the velocities at the end
+    of a step and acts on the bodies during the next one.
+    """
+
+    def __init__(self):
+        self.mass = []
+        self.kin_fric = []
+        self.stat_fric = []
+        self._motors = []
+        self._parent = []  # union-find over bodies, with each body's ratio to its parent
+        self._ratio = []
+        self._built = False
+
+    def add_body(self, mass, kin_fric=0, stat_fric=0):
+        self.mass.append(mass)
+        self.kin_fric.append(kin_fric)
+        self.stat_fric.append(stat_fric)
+        self._parent.append(len(self._parent))
+        self._ratio.append(1.0)
+        self._built = False
+        return len(self.mass) - 1
+
+    def add_motor(self, body, max_vel, stall_torque, deadzone=0):
+        assert 0 <= body < len(self.mass), 'no such body'
+        self._motors.append((body, max_vel, stall_torque, deadzone))
+        self._built = False
+        return len(self._motors) - 1
+
+    def _find(self, body):
+        """(root, g) such that velocity of body = g * velocity of root."""
+        g = 1.0
+        while self._parent[body] != body:
+            g *= self._ratio[body]
+            body = self._parent[body]
+        return body, g
+
+    def couple(self, a, b, ratio=1):
+        """Rigidly join two bodies so that velocity of a = ratio * velocity of b."""
+        ra, ga = self._find(a)
+        rb, gb = self._find(b)
+        if ra == rb:
+            assert abs(ga - ratio * gb) <= 1e-9 * max(abs(ga), 1), 'coupling conflicts with existing gearing'
+            return
+        self._parent[ra] = rb
+        self._ratio[ra] = ratio * gb / ga
+        self._built = False
+
+    def build(self):
+        n = len(self.mass)
+        roots = {}
+        columns = []
+        for body in range(n):
+            root, g = self._find(body)
+            if root not in roots:
+                roots[root] = len(roots)
+                columns.append(np.zeros(n))
+            columns[roots[root]][body] = g
+        self.G = np.stack(columns, axis=1) if columns else np.zeros((n, 0))
+
+        mass = np.asarray(self.mass, dtype=float)
+        absG = np.abs(self.G)
+        self.inertia = (self.G ** 2).T @ mass
+        self.dof_kin_fric = absG.T @ np.asarray(self.kin_fric, dtype=float)
+        self.dof_stat_fric = absG.T @ np.asarray(self.stat_fric, dtype=float)
+
+        motors = np.array(self._motors, dtype=float).reshape(-1, 4)
+        self.motor_body = motors[:, 0].astype(int)
+        self.max_vel = motors[:, 1]
+        self.stall_torque = motors[:, 2]
+        self.deadzone = motors[:, 3]
+
+        dofs = self.G.shape[1]
+        self.dof_pos = np.zeros(dofs)
+        self.dof_vel = np.zeros(dofs)
+        self._power = np.zeros(len(self._motors))
+        self._torques = np.zeros(n)
+        self._impulses = np.zeros(n)
+        self.history = History(FlywheelState, shape=(n,))
+        self.motor_history = History(MotorState, shape=(len(self._motors),))
+        self._built = True
+
+    @property
+    def dofs(self):
+        return self.G.shape[1]
+
+    @property
+    def pos(self):
+        return self.G @ self.dof_pos
+
+    @property
+    def vel(self):
+        return self.G @ self.dof_vel
+
+    @property
+    def power(self):
+        return self._power
+
+    @power.setter
+    def power(self, val):
+        self._power = np.clip(np.broadcast_to(np.asarray(val, dtype=float), self._power.shape), -1, 1)
+
+    def set_power_adj(self, val):
+        val = np.broadcast_to(np.asarray(val, dtype=float), self._power.shape)
+        adj = np.copysign((1 - self.deadzone) * (np.abs(val) - 1) + 1, val)
+        self.power = np.where(np.abs(val) < EPSILON, 0, adj)
+
+    @property
+    def motor_torques(self):
+        power = (1 - self.deadzone) * (np.abs(self._power) - 1) + 1
+        vel = self.vel[self.motor_body]
+        mag = np.maximum(0, np.abs(power) - np.abs(vel) / self.max_vel) * self.stall_torque
+        return np.sign(self._power) * mag
+
+    def apply_torque(self, body, torque):
+        self._torques[body] += torque
+
+    def apply_impulse(self, body, impulse):
+        self._impulses[body] += impulse
+
+    def step(self, dt):
+        assert self._built, 'call build() after changing the drivetrain'
+        torques = self.G.T @ self._torques
+        moving = np.abs(self.dof_vel) > EPSILON
+        torques = np.where(moving, torques - np.sign(self.dof_vel) * self.dof_kin_fric, torques)
+        torques[~moving & (np.abs(torques) < self.dof_stat_fric)] = 0
+
+        acc = (torques * dt + self.G.T @ self._impulses) / self.inertia
+        self.dof_vel += acc
+        self.dof_pos += self.dof_vel * dt
+        self.dof_vel[np.abs(self.dof_vel) <= EPSILON] = 0
+
+        self._impulses[:] = 0
+        self.history.append(self.pos, self.vel, self.G @ acc)
+
+        # As Motor.step after Flywheel.step: this torque drives the next step
+        motor_torques = self.motor_torques
+        self._torques[:] = np.bincount(self.motor_body, motor_torques, minlength=len(self.mass))
+        self.motor_history.append(self._power, motor_torques)
+
+    @property
+    def positions(self):
+        return self.history.column('pos')
+
+    @property
+    def velocities(self):
+        return self.history.column('vel')
+
+    @property
+    def powers(self):
+        return self.motor_history.column('power')
+
+    @property
+    def torques(self):
+        return self.motor_history.column('torque')
+
+
+class DrivetrainSimulation(control.Simulation):
+    """A Simulation whose models are Drivetrains. Only the Euler integrator is supported."""
+
+    def add_drivetrain(self, drivetrain):
+        assert isinstance(drivetrain, Drivetrain), 'not a drivetrain'
+        if not drivetrain._built:
+            drivetrain.build()
+        self.flywheels.append(drivetrain)
+        return drivetrain
+
+    def reserve(self):
+        for d in self.flywheels:
+            d.history.reserve(self.cycles)
+            d.motor_history.reserve(self.cycles)
+
+    def start(self):
+        assert isinstance(self.integrator, EulerIntegrator), 'drivetrains are stepped with the Euler integrator'
+        super().start()
+
+
+def main():
+
+    class _Elevator(DrivetrainSimulation):
+
+        def __init__(self):
+            super().__init__(5)
+            self.drivetrain = Drivetrain()
+            gearbox = self.drivetrain.add_body(0.001, kin_fric=0.005)
+            drum = self.drivetrain.add_body(0.2, kin_fric=0.05, stat_fric=0.1)
+            idler = self.drivetrain.add_body(0.05, kin_fric=0.01)
+            for _ in range(4):
+                self.drivetrain.add_motor(gearbox, 556, 2.42)
+            self.drivetrain.couple(gearbox, drum, 10)
+            self.drivetrain.couple(idler, drum, -2)
+
+        def init(self):
+            self.add_drivetrain(self.drivetrain)
+
+        def loop(self, i, t, dt):
+            self.drivetrain.power = 1 if t < 2 else 0
+
+    sim = _Elevator()
+    sim.simulate()
+    print(f'{sim.drivetrain.dofs} degree(s) of freedom')
+    print('final body velocities:', sim.drivetrain.vel)
+
+
+if __name__ == '__main__':
+    main()
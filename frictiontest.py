@@ -1,5 +1,4 @@
 import control
-import graphutils
 from models import *
 
 
@@ -22,7 +21,13 @@ class FrictionTest(control.Simulation):
         self.motor.set_power_adj(t / 10)
 
 
-if __name__ == '__main__':
+def main():
+    import graphutils
+
     sim = FrictionTest()
     sim.simulate()
     graphutils.graph_vel(f"Friction Test (fs = {STATIC_FRIC} N*m, fk = {KINETIC_FRIC} N*m)", sim.motor, sim.frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,7 @@
 import numpy as np
 
-import matplotlib.pyplot as plt
 from matplotlib import gridspec
-
-import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.lines import Line2D
 
 
 def align_yaxis(ax1, v1, ax2, v2):
@@ -17,166 +14,214 @@ def align_yaxis(ax1, v1, ax2, v2):
     ax2.set_ylim(miny+dy, maxy+dy)
 
 
-def graph_vel_target(title, motor, frames, targets):
-    gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
-
+def minmax_envelope(x, y, buckets):
+    """
+    Decimate a series to the minimum and maximum of each of `buckets` equal slices,
+    in time order, so peaks and overshoot survive. Short series are returned as is.
+    """
+    n = len(y)
+    if buckets < 1 or n <= 2 * buckets + 2:
+        return x, y
+    size = (n - 2) // buckets
+    body = y[1:1 + buckets * size].reshape(buckets, size)
+    lo = np.argmin(body, axis=1)
+    hi = np.argmax(body, axis=1)
+    offsets = 1 + np.arange(buckets) * size
+    picks = np.stack((np.minimum(lo, hi), np.maximum(lo, hi)), axis=1) + offsets[:, None]
+    index = np.concatenate(([0], picks.ravel(), np.arange(1 + buckets * size, n)))
+    return x[index], y[index]
+
+
+class DecimatedLine(Line2D):
+    """
+    A line that keeps the full series but only draws its min/max envelope at about
+    one bucket per pixel of the visible x range, re-decimating after zooms and pans.
+    """
+
+    def __init__(self, x, y, buckets=2000, **kwargs):
+        self.buckets = buckets
+        super().__init__([], [], **kwargs)
+        self.set_series(x, y)
+
+    def set_series(self, x, y):
+        self._series_x = np.asarray(x, dtype=float)
+        self._series_y = np.asarray(y, dtype=float)
+        self._view = None
+        self.set_data(*minmax_envelope(self._series_x, self._series_y, self.buckets))
+
+    def set_decimated(self, x, y):
+        """Draw points that are already decimated as they are, until the next set_series."""
+        self._series_x = self._series_y = None
+        self.set_data(x, y)
+
+    def draw(self, renderer):
+        lo, hi = self.axes.get_xlim()
+        width = int(self.axes.bbox.width)
+        if self._series_x is not None and self._view != (lo, hi, width):
+            self._view = (lo, hi, width)
+            start = max(int(np.searchsorted(self._series_x, lo)) - 1, 0)
+            stop = int(np.searchsorted(self._series_x, hi, side='right')) + 1
+            self.set_data(*minmax_envelope(self._series_x[start:stop], self._series_y[start:stop], width))
+        super().draw(renderer)
+
+
+_LINESTYLES = ('--', '-.', ':', '-')
+
+
+def plot(ax, x, y, fmt):
+    """Like ax.plot(x, y, fmt) for a single series, drawn as a DecimatedLine."""
+    linestyle = next((ls for ls in _LINESTYLES if ls in fmt), '-')
+    color = fmt.replace(linestyle, '') or None
+    line = DecimatedLine(x, y, color=color, linestyle=linestyle)
+    ax.add_line(line)
+    ax.autoscale_view()
+    return line
+
+
+class Layout:
+    """
+    The axes, lines and legends of one graph, built once on a figure and then
+    refilled with data by fill(). Reusing a Layout skips all per-figure setup,
+    which is what render.py does between renders.
+
+    `top` and `top_twin` list (series, fmt) for the upper axes and its right-hand
+    twin, `legend` lists (series, label) in legend order. The motor power and
+    torque series are always drawn in the lower axes.
+    """
+
+    def __init__(self, fig, top, top_ylabel, legend=(), top_twin=(), twin_ylabel=None, torque_primary=False):
+        gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
+        fig.subplots_adjust(hspace=0.4)
+        self.figure = fig
+        self.lines = {}
+
+        self.top = fig.add_subplot(gs[0])
+        bottom = fig.add_subplot(gs[1], sharex=self.top)
+        bottom.set_title('Motor')
+        if torque_primary:
+            self.torque_axes, self.power_axes = bottom, bottom.twinx()
+        else:
+            self.power_axes, self.torque_axes = bottom, bottom.twinx()
+
+        self.top.grid(color='0.75', linewidth=1)
+        self.power_axes.grid(color='0.75', linewidth=1)
+        self._add(self.top, top)
+        self.top.set_xlabel('time (s)')
+        self.top.set_ylabel(top_ylabel)
+
+        self.twin = None
+        if top_twin:
+            self.twin = self.top.twinx()
+            self._add(self.twin, top_twin)
+            self.twin.set_ylabel(twin_ylabel)
+        if legend:
+            self.top.legend([self.lines[k] for k, _ in legend], [label for _, label in legend], loc='lower right')
+
+        self._add(self.power_axes, [('power', 'b')])
+        self.power_axes.set_ylim([-1.1, 1.1])
+        self.power_axes.set_xlabel('time (s)')
+        self.power_axes.set_ylabel('motor power')
+        self.power_axes.set_yticks(np.arange(-1, 1.1, 0.5))
+
+        self.torque_axes.set_ylabel('torque (N*m)')
+        self._add(self.torque_axes, [('torque', 'g')])
+
+        self.power_axes.legend((self.lines['power'], self.lines['torque']), ('power', 'torque'), loc='lower right')
+
+    def _add(self, ax, series):
+        for key, fmt in series:
+            self.lines[key] = plot(ax, [], [], fmt)
+
+    def fill(self, title, frames, series):
+        """Replace every line's data. `series` maps series names to arrays over `frames`."""
+        self.top.set_title(title)
+        self.top.set_autoscalex_on(True)
+        for key, line in self.lines.items():
+            line.set_series(frames, series[key])
+        for ax in (self.top, self.twin, self.torque_axes):
+            if ax is not None:
+                ax.set_autoscaley_on(True)
+                ax.relim()
+                ax.autoscale_view()
+        if self.twin is not None:
+            align_yaxis(self.top, 0, self.twin, 0)
+
+
+def vel_target_layout(fig):
+    return Layout(fig, [('velocity', 'r'), ('target', 'b--')], 'velocity (rad/s)',
+                  legend=[('target', 'target (rad)'), ('velocity', 'velocity')])
+
+
+def vel_layout(fig):
+    return Layout(fig, [('velocity', 'r')], 'velocity (rad/s)')
+
+
+def pos_target_layout(fig):
+    return Layout(fig, [('position', 'r'), ('target', 'b--')], 'position (rad)',
+                  legend=[('position', 'position'), ('target', 'target (rad)'), ('velocity', 'velocity')],
+                  top_twin=[('velocity', 'g-.')], twin_ylabel='velocity (rad/s)')
+
+
+def ff_target_layout(fig):
+    return Layout(fig, [('position', 'r'), ('target', 'b--')], 'position (rad)',
+                  legend=[('position', 'position'), ('target', 'target (rad)'),
+                          ('velocity', 'velocity'), ('derivative', 'derivative')],
+                  top_twin=[('velocity', 'g-.'), ('derivative', 'm:')], twin_ylabel='velocity (rad/s)',
+                  torque_primary=True)
+
+
+LAYOUTS = {
+    'vel_target': vel_target_layout,
+    'vel': vel_layout,
+    'pos_target': pos_target_layout,
+    'ff_target': ff_target_layout,
+}
+
+
+def layout_for(sim):
+    """The layout that suits a simulation: what it tracks, and whether it feeds a derivative forward."""
+    tracks = getattr(sim, 'tracks', None)
+    if tracks is None:
+        return 'vel'
+    if tracks == 'vel':
+        return 'vel_target'
+    return 'ff_target' if np.any(sim.derivatives) else 'pos_target'
+
+
+def series_of(motor, targets=None, derivatives=None):
+    """The series a Layout draws, taken from a motor's and its flywheel's histories."""
     f = motor.flywheel
-    velocities = f.velocities
-    powers = motor.powers
-    torques = motor.torques
-
-    plt.subplots_adjust(hspace=0.4)
-    axv = plt.subplot(gs[0])
-    plt.title(title)
-    
-    axm = plt.subplot(gs[1], sharex=axv)
-    plt.title('Motor')
-
-    axv.grid(color='0.75', linewidth=1)
-    axm.grid(color='0.75', linewidth=1)
-    linev, linet = axv.plot(frames, velocities, 'r', frames, targets, 'b--')
-    axv.set_xlabel('time (s)')
-    axv.set_ylabel('velocity (rad/s)')
-
-    axv.legend((linet, linev), ('target (rad)', 'velocity'), loc='lower right')
-
-    linem, = axm.plot(frames, powers, 'b')
-    axm.set_ylim([-1.1, 1.1])
-    axm.set_xlabel('time (s)')
-    axm.set_ylabel('motor power')
-    axm.set_yticks(np.arange(-1, 1.1, 0.5))
-
-    axt = axm.twinx()
-    axt.set_ylabel('torque (N*m)')
-    linetor, = axt.plot(frames, torques, 'g')
-
-    axm.legend((linem, linetor), ('power', 'torque'), loc='lower right')
-
+    series = {
+        'position': f.positions,
+        'velocity': f.velocities,
+        'power': motor.powers,
+        'torque': motor.torques,
+    }
+    if targets is not None:
+        series['target'] = targets
+    if derivatives is not None:
+        series['derivative'] = derivatives
+    return series
+
+
+def _show(layout, title, frames, series):
+    import matplotlib.pyplot as plt  # only the interactive path needs pyplot
+
+    LAYOUTS[layout](plt.gcf()).fill(title, frames, series)
     plt.show()
 
 
-def graph_vel(title, motor, frames):
-    gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
-
-    f = motor.flywheel
-    velocities = list(f.velocities)
-    powers = list(motor.powers)
-    torques = list(motor.torques)
-
-    plt.subplots_adjust(hspace=0.4)
-    axv = plt.subplot(gs[0])
-    plt.title(title)
-
-    axm = plt.subplot(gs[1], sharex=axv)
-    plt.title('Motor')
-
-    axv.grid(color='0.75', linewidth=1)
-    axm.grid(color='0.75', linewidth=1)
-    linev = axv.plot(frames, velocities, 'r')
-    axv.set_xlabel('time (s)')
-    axv.set_ylabel('velocity (rad/s)')
-
-    linem, = axm.plot(frames, powers, 'b')
-    axm.set_ylim([-1.1, 1.1])
-    axm.set_xlabel('time (s)')
-    axm.set_ylabel('motor power')
-    axm.set_yticks(np.arange(-1, 1.1, 0.5))
-
-    axt = axm.twinx()
-    axt.set_ylabel('torque (N*m)')
-    linetor, = axt.plot(frames, torques, 'g')
+def graph_vel_target(title, motor, frames, targets):
+    _show('vel_target', title, frames, series_of(motor, targets))
 
-    axm.legend((linem, linetor), ('power', 'torque'), loc='lower right')
 
-    plt.show()
+def graph_vel(title, motor, frames):
+    _show('vel', title, frames, series_of(motor))
 
 
 def graph_pos_target(title, motor, frames, targets):
-    gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
-
-    f = motor.flywheel
-    powers = list(motor.powers)
-    torques = list(motor.torques)
-    positions = list(f.positions)
-    velocities = list(f.velocities)
-
-    plt.subplots_adjust(hspace=0.4)
-    axs = plt.subplot(gs[0])
-    plt.title(title)
-
-    axm = plt.subplot(gs[1], sharex=axs)
-    plt.title('Motor')
-
-    axs.grid(color='0.75', linewidth=1)
-    axm.grid(color='0.75', linewidth=1)
-    lines, linet = axs.plot(frames, positions, 'r', frames, targets, 'b--')
-    axs.set_ylabel('position (rad)')
-    axs.set_xlabel('time (s)')
-
-    axv = axs.twinx()
-    linev, = axv.plot(frames, velocities, 'g-.')
-    axv.set_ylabel('velocity (rad/s)')
-
-    axs.legend((lines, linet, linev), ('position', 'target (rad)', 'velocity'), loc='lower right')
-
-    linem, = axm.plot(frames, powers, 'b')
-    axm.set_ylim([-1.1, 1.1])
-    axm.set_xlabel('time (s)')
-    axm.set_ylabel('motor power')
-    axm.set_yticks(np.arange(-1, 1.1, 0.5))
-
-    axt = axm.twinx()
-    axt.set_ylabel('torque (N*m)')
-    linetor, = axt.plot(frames, torques, 'g')
-
-    axm.legend((linem, linetor), ('power', 'torque'), loc='lower right')
-
-    align_yaxis(axs, 0, axv, 0)
-
-    plt.show()
+    _show('pos_target', title, frames, series_of(motor, targets))
 
 
 def graph_ff_target(title, motor, frames, targets, derivatives):
-
-    f = motor.flywheel
-    positions = list(f.positions)
-    velocities = list(f.velocities)
-    powers = list(motor.powers)
-    torques = list(motor.torques)
-
-    gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
-
-    plt.subplots_adjust(hspace=0.4)
-    axs = plt.subplot(gs[0])
-    plt.title(title)
-
-    axt = plt.subplot(gs[1], sharex=axs)
-    plt.title('Motor')
-    axm = axt.twinx()
-
-    axs.grid(color='0.75', linewidth=1)
-    axm.grid(color='0.75', linewidth=1)
-    lines, linet = axs.plot(frames, positions, 'r', frames, targets, 'b--')
-    axs.set_ylabel('position (rad)')
-    axs.set_xlabel('time (s)')
-
-    axv = axs.twinx()
-    linev, lined = axv.plot(frames, velocities, 'g-.', frames, derivatives, 'm:')
-    axv.set_ylabel('velocity (rad/s)')
-
-    axs.legend((lines, linet, linev, lined), ('position', 'target (rad)', 'velocity', 'derivative'), loc='lower right')
-
-    linem, = axm.plot(frames, powers, 'b')
-    axm.set_ylim([-1.1, 1.1])
-    axm.set_xlabel('time (s)')
-    axm.set_ylabel('motor power')
-    axm.set_yticks(np.arange(-1, 1.1, 0.5))
-
-    axt.set_ylabel('torque (N*m)')
-    linetor, = axt.plot(frames, torques, 'g')
-
-    axm.legend((linem, linetor), ('power', 'torque'), loc='lower right')
-
-    align_yaxis(axs, 0, axv, 0)
-
-    plt.show()
+    _show('ff_target', title, frames, series_of(motor, targets, derivatives))
@@ -0,0 +1,347 @@
+from abc import ABC, abstractmethod
+import math
+
+import numpy as np
+
+
+class EulerIntegrator:
+    """The original fixed-step engine: every model is stepped once per physics step."""
+
+    def reset(self):
+        """Forget anything kept from an earlier run. Called by Simulation.start."""
+        pass
+
+    def run(self, sim, start, stop):
+        frames = sim.frames_between(start, stop)
+        dt = sim.step
+        control_dt = dt * sim.steps_per_control
+        for i in range(start, stop):
+            t = frames[i - start]
+            sim.raw_loop(i, t, dt)
+            if i % sim.steps_per_control == 0:
+                sim.loop(i / sim.steps_per_control, t, control_dt)
+            for f in sim.flywheels:
+                f.step(dt)
+            for m in sim.motors:
+                m.step(dt)
+
+
+class Drive:
+    """
+    Net torque on one flywheel between control ticks, while motor powers and the
+    external torque are constant. Each motor's torque is piecewise linear in
+    velocity, so the total is linear on the intervals between breakpoints().
+    """
+
+    def __init__(self, flywheel, motors, external=0):
+        self.mass = flywheel.mass
+        self.kin_fric = flywheel.kin_fric
+        self.stat_fric = flywheel.stat_fric
+        self.external = external
+        # (direction, adjusted power, stall torque, max velocity) of every powered motor
+        self.motors = []
+        for m in motors:
+            if m.power != 0:
+                power = (1 - m.deadzone) * (abs(m.power) - 1) + 1
+                self.motors.append((math.copysign(1, m.power), abs(power), m.stall_torque, m.max_vel))
+
+    def motor_torque(self, v):
+        total = 0
+        for sign, power, stall, max_vel in self.motors:
+            total += sign * max(0, power - abs(v) / max_vel) * stall
+        return total
+
+    def torque(self, v, direction=0):
+        """Net torque with kinetic friction opposing `direction`, or the sign of v if it is 0."""
+        if not direction and v != 0:
+            direction = math.copysign(1, v)
+        return self.motor_torque(v) + self.external - direction * self.kin_fric
+
+    def breaks_away(self):
+        """Whether a flywheel at rest overcomes friction. Returns the direction it starts in, or 0."""
+        t0 = self.motor_torque(0) + self.external
+        if abs(t0) <= max(self.stat_fric, self.kin_fric):
+            return 0
+        return math.copysign(1, t0)
+
+    def breakpoints(self):
+        points = {0.0}
+        for _, power, _, max_vel in self.motors:
+            points.add(power * max_vel)
+            points.add(-power * max_vel)
+        return sorted(points)
+
+    def linear(self, v):
+        """(a, b) such that torque(u) = a + b * u on the open interval containing v."""
+        s = math.copysign(1, v)
+        a = self.external - s * self.kin_fric
+        b = 0
+        for sign, power, stall, max_vel in self.motors:
+            if abs(v) < power * max_vel:
+                a += sign * stall * power
+                b -= sign * stall * s / max_vel
+        return a, b
+
+
+class IntervalIntegrator(ABC):
+    """
+    Base for integrators that advance a whole control period at a time. raw_loop
+    still runs once per physics step (only on control ticks when the simulation's
+    per_step_raw_loop is false), but torques it applies are averaged over the
+    period. State is written to the history on the regular `frames` grid, so the
+    output is interchangeable with EulerIntegrator's.
+
+    Stopping a run between control ticks splits that period in two, which can
+    change the result slightly; checkpoint.checkpoint only stops on ticks.
+    """
+
+    def reset(self):
+        pass
+
+    def run(self, sim, start, stop):
+        frames = sim.frames_between(start, stop)
+        dt = sim.step
+        k = sim.steps_per_control
+        per_step = sim.per_step_raw_loop
+        drives = [(f, [m for m in sim.motors if m.flywheel is f]) for f in sim.flywheels]
+        undriven = [m for m in sim.motors if m.flywheel not in sim.flywheels]
+        i = start
+        while i < stop:
+            n = min(k - i % k, stop - i)
+            if i % k == 0:
+                sim.raw_loop(i, frames[i - start], dt)
+                sim.loop(i / k, frames[i - start], dt * k)
+                first = i + 1
+            else:
+                first = i
+            if per_step:
+                for j in range(first, i + n):
+                    sim.raw_loop(j, frames[j - start], dt)
+            for f, motors in drives:
+                self._advance(f, motors, dt, n)
+            for m in undriven:
+                m.history.extend(np.full(n, m.power), np.full(n, m.torque))
+            i += n
+
+    def _advance(self, flywheel, motors, dt, n):
+        flywheel.vel += flywheel._impulses / flywheel.mass
+        drive = Drive(flywheel, motors, flywheel._torques / n)
+        flywheel._impulses = 0
+        flywheel._torques = 0
+
+        v0 = flywheel.vel
+        pos, vel = self.solve(drive, flywheel.pos, v0, dt, n)
+        # Plain floats from here: a period is only a few samples, too short for NumPy to pay off
+        acc = [v - u for u, v in zip([v0] + vel[:-1], vel)]
+        flywheel.history.extend(pos, vel, acc)
+        flywheel.pos = pos[-1]
+        flywheel.vel = vel[-1]
+        for m in motors:
+            # Like Motor.step, record the torque at the velocity reached by each step
+            power = (1 - m.deadzone) * (abs(m.power) - 1) + 1
+            scale = (math.copysign(m.stall_torque, m.power) if m.power else 0)
+            torques = [scale * max(0, power - abs(u) / m.max_vel) for u in vel]
+            m.history.extend([m.power] * n, torques)
+
+    @abstractmethod
+    def solve(self, drive, x0, v0, dt, n):
+        """Lists of the positions and velocities at times dt, 2 * dt, ..., n * dt."""
+        pass
+
+
+class AnalyticIntegrator(IntervalIntegrator):
+    """
+    Exact solution of mass * dv/dt = a + b * v on each linear piece of the drive
+    torque. Crossings of zero velocity and of motor saturation are located in
+    closed form; at rest the flywheel sticks unless the applied torque exceeds
+    static (and kinetic) friction, in which case it starts moving with kinetic
+    friction applied at once.
+    """
+
+    MAX_SEGMENTS = 1000
+
+    def solve(self, drive, x0, v0, dt, n):
+        end = n * dt
+        mass = drive.mass
+        pos = []
+        vel = []
+        breakpoints = drive.breakpoints()
+        t, x, v = 0.0, x0, v0
+
+        for _ in range(self.MAX_SEGMENTS):
+            k = len(pos)
+            if k == n:
+                return pos, vel
+            if v == 0:
+                direction = drive.breaks_away()
+                if direction == 0:
+                    pos.extend([x] * (n - k))
+                    vel.extend([0.0] * (n - k))
+                    return pos, vel
+            else:
+                force = drive.torque(v)
+                direction = math.copysign(1, force) if force != 0 else 0
+                if direction == 0:
+                    for j in range(k + 1, n + 1):
+                        pos.append(x + v * (j * dt - t))
+                        vel.append(v)
+                    return pos, vel
+
+            # Coefficients of the piece the velocity is about to move through
+            a, b = drive.linear(v + direction * max(abs(v), 1) * 1e-9)
+            ahead = [p for p in breakpoints if (p - v) * direction > 0]
+            target = min(ahead, key=lambda p: abs(p - v)) if ahead else None
+            rate = b / mass
+
+            tau = math.inf
+            if target is not None:
+                if abs(rate) < 1e-12:
+                    tau = mass * (target - v) / a
+                else:
+                    c = -a / b
+                    ratio = (target - c) / (v - c)
+                    if ratio > 0:
+                        tau = math.log(ratio) / rate
+                if not tau > 0:
+                    tau = math.inf
+            stop = min(t + tau, end)
+
+            # Samples up to the end of this piece; _segment, inlined
+            last = min(n, int(stop / dt) + 1)
+            while last > k and last * dt > stop:
+                last -= 1
+            if abs(rate) < 1e-12:
+                acc = a / mass
+                for j in range(k + 1, last + 1):
+                    tau = j * dt - t
+                    pos.append(x + v * tau + acc * tau * tau / 2)
+                    vel.append(v + acc * tau)
+            else:
+                c = -a / (rate * mass)
+                d = v - c
+                for j in range(k + 1, last + 1):
+                    tau = j * dt - t
+                    growth = math.expm1(rate * tau)
+                    pos.append(x + c * tau + d * growth / rate)
+                    vel.append(c + d * (growth + 1))
+
+            x, v = self._segment(x, v, a, rate, mass, stop - t)
+            if stop < end:
+                v = target
+            t = stop
+
+        raise RuntimeError(f'no solution within {self.MAX_SEGMENTS} segments of a control period; '
+                           'the drive switches pieces too often')
+
+    @staticmethod
+    def _segment(x, v, a, rate, mass, tau):
+        if abs(rate) < 1e-12:
+            acc = a / mass
+            return x + v * tau + acc * tau * tau / 2, v + acc * tau
+        c = -a / (rate * mass)
+        growth = math.expm1(rate * tau)
+        return x + c * tau + (v - c) * growth / rate, c + (v - c) * (growth + 1)
+
+
+class AdaptiveIntegrator(IntervalIntegrator):
+    """
+    Bogacki-Shampine 3(2) embedded Runge-Kutta pair with step size control. Steps
+    grow as large as the tolerances allow, up to a whole control period, and are
+    cut short to land on every control tick. Zero-velocity crossings are events:
+    the step is truncated at the crossing and the flywheel either sticks or
+    breaks away again. Output is Hermite-interpolated onto the frames grid.
+    """
+
+    def __init__(self, rtol=1e-6, atol=1e-6, max_steps=10000):
+        self.rtol = rtol
+        self.atol = atol
+        self.max_steps = max_steps
+        self._h = None  # last step size, carried over to the next control period
+
+    def reset(self):
+        self._h = None
+
+    def solve(self, drive, x0, v0, dt, n):
+        times = dt * np.arange(1, n + 1)
+        end = times[-1]
+        pos = np.empty(n)
+        vel = np.empty(n)
+        mass = drive.mass
+        h = self._h or end
+        t, x, v = 0.0, x0, v0
+        k = 0
+
+        for _ in range(self.max_steps):
+            if k == n:
+                break
+            if v == 0:
+                direction = drive.breaks_away()
+                if direction == 0:
+                    pos[k:] = x
+                    vel[k:] = 0
+                    break
+            else:
+                direction = math.copysign(1, v)
+
+            def acc(u):
+                return drive.torque(u, direction) / mass
+
+            a0 = acc(v)
+            h = min(h, end - t)
+            while True:
+                k2 = acc(v + h / 2 * a0)
+                k3 = acc(v + 3 * h / 4 * k2)
+                v1 = v + h * (2 / 9 * a0 + 1 / 3 * k2 + 4 / 9 * k3)
+                a1 = acc(v1)
+                err = h * abs(-5 / 72 * a0 + 1 / 12 * k2 + 1 / 9 * k3 - 1 / 8 * a1)
+                scale = self.atol + self.rtol * max(abs(v), abs(v1))
+                ratio = err / scale
+                if ratio <= 1:
+                    break
+                h *= max(0.2, 0.9 * ratio ** (-1 / 3))
+            x1 = x + h * (v + v1) / 2 + h * h * (a0 - a1) / 12
+
+            stop = t + h
+            crossed = v1 * direction <= 0
+            if crossed:
+                # Zero velocity event: find it on the interpolant and end the step there
+                stop = t + self._root(v, v1, a0 * h, a1 * h) * h
+
+            m = k + int(np.searchsorted(times[k:], stop, side='right'))
+            pos[k:m], vel[k:m] = self._hermite(x, v, a0, v1, a1, h, (times[k:m] - t) / h)
+            k = m
+
+            if crossed:
+                x1, _ = self._hermite(x, v, a0, v1, a1, h, (stop - t) / h)
+                v1 = 0.0
+
+            self._h = h if crossed else h * min(5, 0.9 * max(ratio, 1e-10) ** (-1 / 3))
+            h = self._h
+            t, x, v = stop, x1, v1
+        else:
+            raise RuntimeError(f'no solution within {self.max_steps} steps of a control period; '
+                               'loosen rtol/atol or raise max_steps')
+
+        return pos.tolist(), vel.tolist()
+
+    @staticmethod
+    def _hermite(x0, v0, a0, v1, a1, h, theta):
+        """Cubic Hermite interpolation of velocity, and of position from its quartic integral."""
+        m0 = h * a0
+        c2 = 3 * (v1 - v0) - 2 * m0 - h * a1
+        c3 = 2 * (v0 - v1) + m0 + h * a1
+        vel = v0 + theta * (m0 + theta * (c2 + theta * c3))
+        pos = x0 + h * theta * (v0 + theta * (m0 / 2 + theta * (c2 / 3 + theta * c3 / 4)))
+        return pos, vel
+
+    @classmethod
+    def _root(cls, v0, v1, m0, m1, iterations=60):
+        lo, hi = 0.0, 1.0
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            _, v = cls._hermite(0, v0, m0, v1, m1, 1, mid)
+            if (v > 0) == (v0 > 0) and v != 0:
+                lo = mid
+            else:
+                hi = mid
+        return hi
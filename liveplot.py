@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+import graphutils
+
+
+def has_display():
+    """Whether matplotlib can open a window here."""
+    import matplotlib
+
+    try:
+        from matplotlib.backends import BackendFilter, backend_registry
+        non_interactive = backend_registry.list_builtin(BackendFilter.NON_INTERACTIVE)
+    except ImportError:  # matplotlib < 3.9
+        from matplotlib.rcsetup import non_interactive_bk as non_interactive
+    if matplotlib.get_backend().lower() in non_interactive:
+        return False
+    if sys.platform.startswith('linux'):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
+
+class _Envelope:
+    """
+    The min/max envelope of a growing series, as graphutils.minmax_envelope
+    draws it, extended one whole bucket of `size` samples at a time so that each
+    update only reads the samples added since the last one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self._done = 0  # samples folded into whole buckets
+
+    def extend(self, x, y):
+        """The envelope of y[:len(y)], followed by the samples of its unfinished bucket."""
+        n = len(y)
+        buckets = (n - self._done) // self.size
+        if buckets:
+            stop = self._done + buckets * self.size
+            body = y[self._done:stop].reshape(buckets, self.size)
+            lo = np.argmin(body, axis=1)
+            hi = np.argmax(body, axis=1)
+            offsets = self._done + np.arange(buckets) * self.size
+            picks = (np.stack((np.minimum(lo, hi), np.maximum(lo, hi)), axis=1) + offsets[:, None]).ravel()
+            self.x = np.concatenate((self.x, x[picks]))
+            self.y = np.concatenate((self.y, y[picks]))
+            self._done = stop
+        return np.concatenate((self.x, x[self._done:n])), np.concatenate((self.y, y[self._done:n]))
+
+
+class LiveView:
+    """
+    Plots a simulation's position, target, velocity, power and torque while it
+    runs, in the same process. The simulation advances in slices sized, from the
+    measured step rate, to last one frame period (1 / `fps`), or long enough that
+    drawing takes at most `max_share` of the wall time; each slice is followed by
+    one frame. Every line keeps an incrementally built min/max envelope of its
+    history at about graphutils.DecimatedLine's resolution, so a frame reads only
+    the steps of the last slice and blits a bounded number of points over a
+    cached background, however long the run.
+
+    The x axes span the whole run from the start, so only a y range outgrowing
+    its axes forces a full redraw. Without a display (or with interactive=False)
+    the simulation just runs, and the final graph is saved to `path` if given.
+    """
+
+    def __init__(self, sim, layout=None, title='', fps=10, max_share=0.1, path=None, interactive=None):
+        self.sim = sim
+        self.layout = layout
+        self.title = title
+        self.fps = fps
+        self.max_share = max_share
+        self.path = path
+        self.interactive = has_display() if interactive is None else interactive
+        self.frames_drawn = 0
+        self.full_redraws = 0
+        self.drawing = 0  # seconds spent drawing
+
+    def _series(self, n):
+        sim = self.sim
+        targeted = hasattr(sim, 'targets')
+        series = graphutils.series_of(sim.motor, sim.targets if targeted else None,
+                                      sim.derivatives if targeted else None)
+        return {k: v[:n] for k, v in series.items()}
+
+    def simulate(self, block=True):
+        sim = self.sim
+        if not self.interactive:
+            print('no display: running without the live view', file=sys.stderr)
+            sim.simulate()
+            self._save()
+            return
+
+        import matplotlib.pyplot as plt
+
+        sim.start()
+        try:
+            self.figure = plt.figure()
+            layout = graphutils.LAYOUTS[self.layout or graphutils.layout_for(sim)](self.figure)
+            self._layout = layout
+            layout.top.set_title(self.title)
+            self._axes = {line.axes for line in layout.lines.values()}
+            for line in layout.lines.values():
+                line.set_animated(True)
+            for ax in self._axes:
+                ax.set_xlim(0, sim.duration)
+                ax.set_autoscale_on(False)
+            self._limits = {ax: ax.get_ylim() for ax in self._axes}
+            self._envelopes = {key: _Envelope(max(2, sim.cycles // line.buckets))
+                               for key, line in layout.lines.items()}
+            self._drawn = 0  # steps already in the envelopes
+            if 'target' in layout.lines:
+                # The targets are known ahead, so the axes start out fitted to them
+                self._fit(layout.lines['target'].axes, self._series(sim.cycles)['target'])
+            plt.show(block=False)
+            self._redraw()
+
+            period = 1 / self.fps
+            steps = sim.steps_per_control
+            while sim.cursor < sim.cycles:
+                began = time.perf_counter()
+                sim.advance(min(sim.cursor + steps, sim.cycles))
+                now = time.perf_counter()
+                self._frame()
+                spent = time.perf_counter() - now
+                self.drawing += spent
+                rate = steps / max(now - began, 1e-6)
+                steps = max(1, int(rate * max(period, spent / self.max_share)))
+        finally:
+            sim.finish()
+
+        # The finished graph, drawn normally so it can be zoomed and panned
+        for line in layout.lines.values():
+            line.set_animated(False)
+        layout.fill(self.title, sim.frames, self._series(sim.cycles))
+        self.figure.canvas.draw_idle()
+        self._save()
+        if block:
+            plt.show()
+
+    def _redraw(self):
+        canvas = self.figure.canvas
+        canvas.draw()
+        self._background = canvas.copy_from_bbox(self.figure.bbox)
+        self.full_redraws += 1
+
+    def _frame(self):
+        layout = self._layout
+        n = self.sim.cursor
+        frames = self.sim.frames
+        grown = False
+        for key, values in self._series(n).items():
+            if key not in layout.lines:
+                continue
+            line = layout.lines[key]
+            line.set_decimated(*self._envelopes[key].extend(frames, values))
+
+            if line.axes is not layout.power_axes:
+                grown |= self._fit(line.axes, values[self._drawn:n])
+        self._drawn = n
+        if grown:
+            if layout.twin is not None:
+                graphutils.align_yaxis(layout.top, 0, layout.twin, 0)
+                self._limits[layout.twin] = layout.twin.get_ylim()
+            self._redraw()
+
+        canvas = self.figure.canvas
+        canvas.restore_region(self._background)
+        for line in layout.lines.values():
+            line.axes.draw_artist(line)
+        canvas.blit(self.figure.bbox)
+        canvas.flush_events()
+        self.frames_drawn += 1
+
+    def _fit(self, ax, values):
+        """Grow ax's y range to take in values. Returns whether it grew."""
+        if not len(values) or np.isnan(values).all():
+            return False
+        lo, hi = np.nanmin(values), np.nanmax(values)
+        low, high = self._limits[ax]
+        if low <= lo and hi <= high:
+            return False
+        # Grow by half the span again, so the axes rarely need another full redraw
+        margin = (max(hi, high) - min(lo, low)) / 2 or 1
+        self._limits[ax] = (min(lo, low) - (margin if lo < low else 0),
+                            max(hi, high) + (margin if hi > high else 0))
+        ax.set_ylim(self._limits[ax])
+        return True
+
+    def _save(self):
+        if self.path is None:
+            return
+        import render
+
+        sim = self.sim
+        targeted = hasattr(sim, 'targets')
+        render.render(render.job(self.path, self.layout or graphutils.layout_for(sim), self.title, sim.motor,
+                                 sim.frames, sim.targets if targeted else None,
+                                 sim.derivatives if targeted else None))
+
+
+def main():
+    from splinepositionpid import SplinePositionSimulation
+
+    sim = SplinePositionSimulation()
+    view = LiveView(sim, title='Spline position PID (live)')
+    start = time.perf_counter()
+    view.simulate()
+    elapsed = time.perf_counter() - start
+    if view.interactive:
+        print(f'{sim.cycles} steps in {elapsed:.2f} s, {view.frames_drawn} frames '
+              f'({view.full_redraws} full redraws, {view.drawing:.2f} s drawing)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,14 @@
 import math
 
+import numpy as np
+
 
 class Spline:
+    """
+    Cubic Hermite spline through `points` at x = 0, 1, 2, ... Each segment is stored
+    as polynomial coefficients, so values and exact derivatives can be evaluated
+    for a single x or a whole array of them at once.
+    """
 
     def __init__(self, *points, tangents=None):
         assert tangents is None or len(points) == len(tangents)
@@ -9,18 +16,58 @@ class Spline:
         for p, t in zip(points, tangents if tangents is not None else (0 for _ in points)):
             self.points.append((p, t))
 
+        p = np.array([pt[0] for pt in self.points], dtype=float)
+        m = np.array([pt[1] for pt in self.points], dtype=float)
+        p0, p1, m0, m1 = p[:-1], p[1:], m[:-1], m[1:]
+        # Row i holds c0..c3 of segment i: p(t) = c0 + c1*t + c2*t^2 + c3*t^3
+        self.coefficients = np.stack((p0, m0, 3 * (p1 - p0) - 2 * m0 - m1, 2 * (p0 - p1) + m0 + m1), axis=1)
+        self._segments = self.coefficients.tolist()
+
     def __call__(self, item):
-        assert isinstance(item, float) or isinstance(item, int)
+        return self._evaluate(item, 0)
+
+    def derivative(self, item):
+        return self._evaluate(item, 1)
+
+    def second_derivative(self, item):
+        return self._evaluate(item, 2)
+
+    def _evaluate(self, item, order):
+        if np.ndim(item) == 0:
+            return self._evaluate_scalar(item, order)
+        x = np.asarray(item, dtype=float)
+        if not self._segments:
+            # A single point: a constant
+            return np.full(x.shape, float(self.points[0][0]) if order == 0 else 0.0)
+        segment = np.clip(np.floor(x), 0, len(self._segments) - 1).astype(int)
+        t = x - segment
+        coefficients = self.coefficients[segment]
+        c0, c1, c2, c3 = (coefficients[..., k] for k in range(4))
+        if order == 0:
+            out = c0 + t * (c1 + t * (c2 + t * c3))
+            out[x < 0] = self.points[0][0]
+            out[x >= len(self.points) - 1] = self.points[-1][0]
+            return out
+        if order == 1:
+            out = c1 + t * (2 * c2 + t * 3 * c3)
+        else:
+            out = 2 * c2 + 6 * c3 * t
+        out[(x < 0) | (x >= len(self.points) - 1)] = 0
+        return out
+
+    def _evaluate_scalar(self, item, order):
         if item < 0:
-            return self.points[0][0]
+            return self.points[0][0] if order == 0 else 0
         i0 = int(math.floor(item))
-        i1 = i0 + 1
-        if i1 == len(self.points):
-            return self.points[len(self.points) - 1][0]
-        p0, m0 = self.points[i0]
-        p1, m1 = self.points[i1]
+        if i0 >= len(self._segments):
+            return self.points[-1][0] if order == 0 else 0
+        c0, c1, c2, c3 = self._segments[i0]
         t = item - i0
-        return h00(t) * p0 + h10(t) * m0 + h01(t) * p1 + h11(t) * m1
+        if order == 0:
+            return c0 + t * (c1 + t * (c2 + t * c3))
+        if order == 1:
+            return c1 + t * (2 * c2 + t * 3 * c3)
+        return 2 * c2 + 6 * c3 * t
 
 
 def h00(t): return 2 * t**3 - 3 * t**2 + 1
@@ -40,7 +87,6 @@ def derivative(f, h=0.001):
 
 if __name__ == '__main__':
     s = Spline(0, 1, 5, 2, 1)
-    ds = derivative(s)
-    for i in range(0, 21):
-        x = i / 5
-        print(x, round(s(x), 2), round(ds(x), 2))
+    xs = np.arange(0, 21) / 5
+    for x, y, dy in zip(xs, s(xs), s.derivative(xs)):
+        print(x, round(y, 2), round(dy, 2))
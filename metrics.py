@@ -0,0 +1,165 @@
+"""
+Control performance metrics computed on history arrays.
+
+Time runs along axis 0, so every function takes either single runs (1-D
+arrays, returning floats) or batches with one column per run (2-D arrays of
+shape (cycles, runs) from batch.py or stacked sweeps, returning one value per
+run). Targets may be shared by every run (1-D) or per run (2-D).
+"""
+import numpy as np
+
+
+def _out(value):
+    return float(value) if np.ndim(value) == 0 else value
+
+
+def _dt(frames, ndim):
+    """Width of the interval after each frame (the last repeats the one before)."""
+    frames = np.asarray(frames, dtype=float)
+    dt = np.diff(frames, append=2 * frames[-1] - frames[-2]) if len(frames) > 1 else np.zeros(1)
+    return dt.reshape((-1,) + (1,) * (ndim - 1))
+
+
+def _time(frames, ndim):
+    return np.asarray(frames, dtype=float).reshape((-1,) + (1,) * (ndim - 1))
+
+
+def error(targets, actual):
+    actual = np.asarray(actual, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    if targets.ndim < actual.ndim:
+        targets = targets.reshape(targets.shape + (1,) * (actual.ndim - targets.ndim))
+    return targets - actual
+
+
+def segment(frames, start=None, stop=None):
+    """Slice of the frames in [start, stop), for measuring one step of a target profile."""
+    frames = np.asarray(frames)
+    first = 0 if start is None else int(np.searchsorted(frames, start, 'left'))
+    last = len(frames) if stop is None else int(np.searchsorted(frames, stop, 'left'))
+    return slice(first, last)
+
+
+def iae(frames, targets, actual):
+    """Integrated absolute error."""
+    e = error(targets, actual)
+    return _out(np.sum(np.abs(e) * _dt(frames, e.ndim), axis=0))
+
+
+def ise(frames, targets, actual):
+    """Integrated squared error."""
+    e = error(targets, actual)
+    return _out(np.sum(e * e * _dt(frames, e.ndim), axis=0))
+
+
+def itae(frames, targets, actual):
+    """Integrated time-weighted absolute error, with time measured from frames[0]."""
+    e = error(targets, actual)
+    t = _time(frames, e.ndim) - frames[0]
+    return _out(np.sum(t * np.abs(e) * _dt(frames, e.ndim), axis=0))
+
+
+def max_error(frames, targets, actual):
+    """(largest absolute error, the time it occurs)."""
+    e = np.abs(error(targets, actual))
+    index = np.argmax(e, axis=0)
+    return _out(np.max(e, axis=0)), _out(np.asarray(frames)[index])
+
+
+def _progress(actual, final, initial):
+    """How far along the step from initial to final each sample is (0 at initial, 1 at final)."""
+    actual = np.asarray(actual, dtype=float)
+    if initial is None:
+        initial = actual[0]
+    span = np.asarray(final, dtype=float) - initial
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (actual - initial) / span
+
+
+def _first(mask, frames):
+    index = np.argmax(mask, axis=0)
+    times = np.asarray(frames, dtype=float)[index]
+    return np.where(mask.any(axis=0), times, np.nan)
+
+
+def overshoot(actual, final, initial=None):
+    """Peak overshoot past `final` as a fraction of the step from `initial` (default: the first sample)."""
+    progress = _progress(actual, final, initial)
+    return _out(np.maximum(np.nanmax(progress, axis=0) - 1, 0))
+
+
+def rise_time(frames, actual, final, initial=None, low=0.1, high=0.9):
+    """Time to go from `low` to `high` of the step; nan if it never gets there."""
+    progress = _progress(actual, final, initial)
+    return _out(_first(progress >= high, frames) - _first(progress >= low, frames))
+
+
+def settling_time(frames, actual, final, initial=None, band=0.02):
+    """
+    Time from frames[0] until the response stays within `band` (a fraction of
+    the step) of `final`; nan if it is still outside at the last frame.
+    """
+    progress = _progress(actual, final, initial)
+    outside = ~(np.abs(progress - 1) <= band)
+    frames = np.asarray(frames, dtype=float)
+    # Index of the last sample outside the band, counted from the end
+    last = len(frames) - 1 - np.argmax(outside[::-1], axis=0)
+    settled = np.where(outside.any(axis=0), np.minimum(last + 1, len(frames) - 1), 0)
+    times = frames[settled] - frames[0]
+    return _out(np.where(outside[-1], np.nan, times))
+
+
+def control_effort(frames, powers, squared=False):
+    """Integral of |power| (or power squared) over the run."""
+    powers = np.asarray(powers, dtype=float)
+    magnitude = powers * powers if squared else np.abs(powers)
+    return _out(np.sum(magnitude * _dt(frames, powers.ndim), axis=0))
+
+
+def saturation_fraction(powers, limit=1, tolerance=1e-9):
+    """Fraction of the run with the motor power at its limit."""
+    powers = np.asarray(powers, dtype=float)
+    return _out(np.mean(np.abs(powers) >= limit - tolerance, axis=0))
+
+
+def tracking(frames, targets, actual, powers=None):
+    """The error integrals and the largest error of a tracking run, plus effort and saturation given powers."""
+    peak, when = max_error(frames, targets, actual)
+    result = {
+        'IAE': iae(frames, targets, actual),
+        'ISE': ise(frames, targets, actual),
+        'ITAE': itae(frames, targets, actual),
+        'max error': peak,
+        'max error t': when,
+    }
+    if powers is not None:
+        result['effort'] = control_effort(frames, powers)
+        result['saturated'] = saturation_fraction(powers)
+    return result
+
+
+def step_response(frames, actual, final, initial=None, band=0.02):
+    return {
+        'overshoot': overshoot(actual, final, initial),
+        'rise time': rise_time(frames, actual, final, initial),
+        'settling time': settling_time(frames, actual, final, initial, band),
+    }
+
+
+def main():
+    from positionpid import PositionSimulation
+
+    sim = PositionSimulation()
+    sim.simulate()
+    frames, positions = sim.frames, sim.flywheel.positions
+    for name, value in tracking(frames, sim.targets, positions, sim.motor.powers).items():
+        print(f'{name:14} {value:.4f}')
+
+    # The step from 0 to 6 rad at t=3 s
+    step = segment(frames, 3, 10)
+    for name, value in step_response(frames[step], positions[step], 6, 0).items():
+        print(f'{name:14} {value:.4f}')
+
+
+if __name__ == '__main__':
+    main()
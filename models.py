@@ -8,6 +8,84 @@ EPSILON = 0.001
 FlywheelState = namedtuple('FlywheelState', ('pos', 'vel', 'acc'))
 
 
+class History:
+    """
+    Columnar, preallocated record of model states. Each field of the row type is
+    stored in its own NumPy array, so column() is a zero-copy view. Rows may be
+    scalars or arrays of a fixed shape (see batch.py).
+    """
+
+    def __init__(self, row_type, capacity=0, shape=()):
+        self.row_type = row_type
+        self.shape = shape
+        self._index = {name: i for i, name in enumerate(row_type._fields)}
+        self._columns = [np.empty((capacity,) + shape) for _ in row_type._fields]
+        self._len = 0
+
+    @classmethod
+    def wrap(cls, row_type, columns):
+        """
+        An empty history that appends into existing arrays (one per field, e.g.
+        views of shared memory) instead of allocating its own. Appending past
+        their length moves the history to private arrays.
+        """
+        history = cls(row_type, shape=columns[0].shape[1:])
+        history._columns = list(columns)
+        return history
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('history index out of range')
+        return self.row_type(*(c[i] for c in self._columns))
+
+    def __iter__(self):
+        return (self[i] for i in range(self._len))
+
+    @property
+    def capacity(self):
+        return len(self._columns[0])
+
+    def reserve(self, rows):
+        """Make room for at least `rows` more appends without reallocating."""
+        needed = self._len + rows
+        if needed > self.capacity:
+            self._resize(needed)
+
+    def _resize(self, capacity):
+        for i, old in enumerate(self._columns):
+            new = np.empty((capacity,) + self.shape)
+            new[:self._len] = old[:self._len]
+            self._columns[i] = new
+
+    def append(self, *values):
+        n = self._len
+        if n == self.capacity:
+            self._resize(max(16, 2 * n))
+        for c, v in zip(self._columns, values):
+            c[n] = v
+        self._len = n + 1
+
+    def extend(self, *columns):
+        """Append many rows at once, given one array per field."""
+        rows = len(columns[0])
+        self.reserve(rows)
+        n = self._len
+        for c, v in zip(self._columns, columns):
+            c[n:n + rows] = v
+        self._len = n + rows
+
+    def column(self, name):
+        return self._columns[self._index[name]][:self._len]
+
+    def clear(self):
+        self._len = 0
+
+
 class Flywheel:
 
     def __init__(self, mass, kin_fric=0, stat_fric=0):
@@ -18,7 +96,7 @@ class Flywheel:
         self.stat_fric = stat_fric  # N*m
         self._impulses = 0  # N*m*s
         self._torques = 0  # N*m
-        self.history = []
+        self.history = History(FlywheelState)
 
     @property
     def ang_momentum(self):
@@ -47,7 +125,7 @@ class Flywheel:
         if not self.is_moving:
             self.vel = 0
 
-        self.history.append(FlywheelState(self.pos, self.vel, acc))
+        self.history.append(self.pos, self.vel, acc)
             
     @property
     def is_moving(self):
@@ -55,11 +133,15 @@ class Flywheel:
 
     @property
     def velocities(self):
-        return (s.vel for s in self.history)
+        return self.history.column('vel')
 
     @property
     def positions(self):
-        return (s.pos for s in self.history)
+        return self.history.column('pos')
+
+    @property
+    def accelerations(self):
+        return self.history.column('acc')
 
     def apply_impulse(self, impulse):
         self._impulses += impulse
@@ -93,6 +175,8 @@ class PID:
 
 MotorState = namedtuple('MotorState', ('power', 'torque'))
 
+TargetState = namedtuple('TargetState', ('target', 'derivative'))
+
 
 class Motor:
 
@@ -103,7 +187,7 @@ class Motor:
         self.deadzone = deadzone
 
         self._power = 0
-        self.history = []
+        self.history = History(MotorState)
 
     @property
     def power(self):
@@ -127,13 +211,14 @@ class Motor:
 
     @property
     def powers(self):
-        return (s.power for s in self.history)
+        return self.history.column('power')
 
     @property
     def torques(self):
-        return (s.torque for s in self.history)
+        return self.history.column('torque')
 
     def step(self, dt):
-        self.history.append(MotorState(self.power, self.torque))
-        self.flywheel.apply_torque(self.torque)
+        torque = self.torque
+        self.history.append(self.power, torque)
+        self.flywheel.apply_torque(torque)
         
@@ -0,0 +1,233 @@
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+# Where each sampled parameter lives on a scenario: (model attribute, parameter attribute)
+PARAMETERS = {
+    'mass': ('flywheel', 'mass'),
+    'kin_fric': ('flywheel', 'kin_fric'),
+    'stat_fric': ('flywheel', 'stat_fric'),
+    'deadzone': ('motor', 'deadzone'),
+    'stall_torque': ('motor', 'stall_torque'),
+    'max_vel': ('motor', 'max_vel'),
+}
+
+SIGNALS = {
+    'position': lambda sim: sim.flywheel.positions,
+    'velocity': lambda sim: sim.flywheel.velocities,
+    'power': lambda sim: sim.motor.powers,
+    'torque': lambda sim: sim.motor.torques,
+}
+
+MonteCarloResult = namedtuple('MonteCarloResult', ('times', 'envelope', 'metrics', 'parameters'))
+
+
+def sample(spec, rng, n=None):
+    """
+    Draw from a distribution spec: a constant, ('normal', mean, sd),
+    ('uniform', low, high), ('lognormal', mean, sigma) or ('choice', values).
+    Normal draws are truncated to positive values (negative or zero draws are
+    drawn again), since a zero mass or maximum velocity cannot be simulated.
+    """
+    if np.ndim(spec) == 0:
+        return spec if n is None else np.full(n, spec)
+    kind, *args = spec
+    if kind == 'normal':
+        values = rng.normal(*args, size=n)
+        if n is None:
+            while values <= 0:
+                values = rng.normal(*args)
+            return values
+        bad = values <= 0
+        while bad.any():
+            values[bad] = rng.normal(*args, size=int(bad.sum()))
+            bad = values <= 0
+        return values
+    if kind == 'uniform':
+        return rng.uniform(*args, size=n)
+    if kind == 'lognormal':
+        return rng.lognormal(*args, size=n)
+    if kind == 'choice':
+        return rng.choice(args[0], size=n)
+    raise ValueError(f'unknown distribution {kind!r}')
+
+
+class PercentileEnvelope:
+    """
+    Streaming per-timestep percentiles. Each timestep keeps a histogram of `bins`
+    bins over [low, high), so memory depends on the number of timesteps and bins
+    but never on the number of trials. When samples fall outside the range it
+    doubles, towards the side they are on, and neighbouring bins are merged in
+    pairs, so the counts stay exact and only the resolution coarsens. Exact
+    running minimum, maximum and mean are kept alongside.
+    """
+
+    def __init__(self, steps, low, high, bins=256):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.counts = np.zeros((steps, bins), dtype=np.int64)
+        self.trials = 0
+        self.minimum = np.full(steps, np.inf)
+        self.maximum = np.full(steps, -np.inf)
+        self._sum = np.zeros(steps)
+
+    def add(self, runs):
+        """Add a (trials, steps) block of samples."""
+        runs = np.atleast_2d(runs)
+        finite = runs[np.isfinite(runs)]
+        if len(finite):
+            self._grow(float(finite.min()), float(finite.max()))
+        steps = self.counts.shape[0]
+        scale = self.bins / (self.high - self.low)
+        index = np.clip(((runs - self.low) * scale).astype(np.int64), 0, self.bins - 1)
+        flat = (index + np.arange(steps) * self.bins).ravel()
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.trials += len(runs)
+        np.minimum(self.minimum, runs.min(axis=0), out=self.minimum)
+        np.maximum(self.maximum, runs.max(axis=0), out=self.maximum)
+        self._sum += runs.sum(axis=0)
+
+    def _grow(self, lo, hi):
+        while lo < self.low or hi >= self.high:
+            # Place the old bins in the lower half, upper half or middle of the new range
+            shift = self.bins if lo < self.low else 0
+            if lo < self.low and hi >= self.high:
+                shift = self.bins // 2
+            width = (self.high - self.low) / self.bins
+            padded = np.zeros((self.counts.shape[0], 2 * self.bins), dtype=self.counts.dtype)
+            padded[:, shift:shift + self.bins] = self.counts
+            self.counts = padded.reshape(-1, self.bins, 2).sum(axis=2)
+            self.low -= shift * width
+            self.high = self.low + 2 * self.bins * width
+
+    @property
+    def mean(self):
+        return self._sum / self.trials
+
+    def percentile(self, q):
+        """The q-th percentile (0-100) at every timestep, interpolated within bins."""
+        cumulative = np.cumsum(self.counts, axis=1)
+        rank = q / 100 * self.trials
+        b = np.minimum((cumulative < rank).sum(axis=1), self.bins - 1)
+        steps = np.arange(len(b))
+        below = np.where(b > 0, cumulative[steps, b - 1], 0)
+        inside = self.counts[steps, b]
+        fraction = np.where(inside > 0, (rank - below) / np.maximum(inside, 1), 0)
+        value = self.low + (b + np.clip(fraction, 0, 1)) * (self.high - self.low) / self.bins
+        return np.clip(value, self.minimum, self.maximum)
+
+
+def _run_chunk(sim_factory, distributions, seeds, signal, every, metrics):
+    signal = SIGNALS[signal]
+    samples = []
+    scores = {name: [] for name in metrics}
+    parameters = {name: [] for name in distributions}
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        sim = sim_factory()
+        for name, spec in distributions.items():
+            model, attr = PARAMETERS[name]
+            value = float(sample(spec, rng))
+            setattr(getattr(sim, model), attr, value)
+            parameters[name].append(value)
+        sim.simulate()
+        samples.append(np.asarray(signal(sim))[::every])
+        for name, fn in metrics.items():
+            scores[name].append(float(fn(sim)))
+    return np.array(samples), scores, parameters
+
+
+def run(sim_factory, distributions, trials, signal='velocity', metrics=None, every=1,
+        percentiles=(5, 50, 95), bounds=None, bins=256, chunk=16, processes=None, seed=0):
+    """
+    Run `trials` copies of sim_factory() with the parameters named in
+    `distributions` (see PARAMETERS and sample) drawn per trial, across a process
+    pool. Every `every`-th sample of `signal` (by default all of them) is folded
+    into a PercentileEnvelope chunk by chunk, so no trial's full history is
+    retained.
+    `metrics` maps names to picklable fn(sim) -> float, scored per trial.
+
+    bounds is the initial (low, high) histogram range of the signal; by default
+    it is taken from the first chunk, widened by half its span on each side. The
+    range grows to take in later chunks that fall outside it.
+    """
+    metrics = metrics or {}
+    unknown = set(distributions) - set(PARAMETERS)
+    assert not unknown, f'unknown parameters: {sorted(unknown)}'
+
+    seeds = np.random.SeedSequence(seed).generate_state(trials).tolist()
+    chunks = [seeds[k:k + chunk] for k in range(0, trials, chunk)]
+    args = (sim_factory, distributions)
+    tail = (signal, every, metrics)
+
+    processes = min(processes or os.cpu_count() or 1, len(chunks))
+    if processes <= 1:
+        results = (_run_chunk(*args, c, *tail) for c in chunks)
+        return _collect(results, sim_factory, every, percentiles, bounds, bins)
+    with ProcessPoolExecutor(processes) as pool:
+        return _collect(_bounded(pool, chunks, args, tail, 2 * processes),
+                        sim_factory, every, percentiles, bounds, bins)
+
+
+def _bounded(pool, chunks, args, tail, window):
+    """Chunk results in order, with at most `window` chunks queued or unread at once."""
+    pending = deque()
+    for c in chunks:
+        if len(pending) == window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(_run_chunk, *args, c, *tail))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _collect(results, sim_factory, every, percentiles, bounds, bins):
+    envelope = None
+    scores = {}
+    parameters = {}
+    for samples, chunk_scores, chunk_parameters in results:
+        if envelope is None:
+            if bounds is None:
+                low, high = float(samples.min()), float(samples.max())
+                margin = (high - low) / 2 or 1
+                bounds = (low - margin, high + margin)
+            envelope = PercentileEnvelope(samples.shape[1], *bounds, bins=bins)
+        envelope.add(samples)
+        for name, values in chunk_scores.items():
+            scores.setdefault(name, []).extend(values)
+        for name, values in chunk_parameters.items():
+            parameters.setdefault(name, []).extend(values)
+
+    sim = sim_factory()
+    times = sim.frames[::every]
+    bands = {q: envelope.percentile(q) for q in percentiles}
+    bands['mean'] = envelope.mean
+    bands['min'] = envelope.minimum
+    bands['max'] = envelope.maximum
+    return MonteCarloResult(times, bands,
+                            {k: np.array(v) for k, v in scores.items()},
+                            {k: np.array(v) for k, v in parameters.items()})
+
+
+def main():
+    from disturbedspeedpid import DisturbedSpeedSimulation
+    from tuner import velocity_iae
+
+    result = run(DisturbedSpeedSimulation, {
+        'mass': ('normal', 0.01, 0.001),
+        'kin_fric': ('uniform', 0.005, 0.02),
+        'stat_fric': ('uniform', 0.01, 0.04),
+        'stall_torque': ('normal', 2.42, 0.1),
+    }, trials=32, metrics={'iae': velocity_iae})
+
+    iae = result.metrics['iae']
+    print(f'velocity IAE: p5={np.percentile(iae, 5):.3f} p50={np.median(iae):.3f} p95={np.percentile(iae, 95):.3f}')
+    worst = np.argmax(result.envelope[95] - result.envelope[5])
+    print(f'widest p5-p95 band at t={result.times[worst]:.2f}s: '
+          f'{result.envelope[5][worst]:.2f} to {result.envelope[95][worst]:.2f} rad/s')
+
+
+if __name__ == '__main__':
+    main()
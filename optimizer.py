@@ -0,0 +1,158 @@
+"""
+Evolutionary PID gain search that stops hopeless candidates early.
+
+Each candidate runs in slices of `check` seconds. After every slice the error
+metric is measured over the steps so far; integral metrics (iae, ise, itae)
+only grow, so once that partial cost exceeds the cost a candidate would need to
+be selected, or the error exceeds `bound`, the rest of the run cannot change the
+outcome and is skipped. Diverging or saturated candidates typically stop within
+the first slices.
+
+Selection is a (parents + offspring) evolution strategy over the gains scaled
+to their (low, high) ranges. Offspring of a generation are evaluated together in
+a process pool that lives for the whole search.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import bisect
+import os
+
+import numpy as np
+
+import metrics
+from models import PID
+from tuner import GAINS
+
+# steps: how many steps were simulated; aborted runs have score inf
+Candidate = namedtuple('Candidate', ('score',) + GAINS + ('steps',))
+
+
+def _actual(sim):
+    return sim.flywheel.positions if sim.tracks == 'pos' else sim.flywheel.velocities
+
+
+def evaluate(sim_factory, gains, metric=metrics.iae, limit=np.inf, bound=np.inf, check=0.5):
+    """
+    Run sim_factory() with PID(*gains), scored by metric(frames, targets, actual)
+    on the tracked state. Returns (cost, steps simulated); the cost is inf if the
+    run was stopped because its cost passed `limit` or its error passed `bound`.
+    """
+    sim = sim_factory()
+    sim.pid = PID(*gains)
+    sim.start()
+    chunk = max(1, int(round(check / sim.step)))
+    cost = np.inf
+    try:
+        while sim.cursor < sim.cycles:
+            start = sim.cursor
+            sim.advance(min(start + chunk, sim.cycles))
+            n = sim.cursor
+            actual = _actual(sim)
+            cost = metric(sim.frames[:n], sim.targets[:n], actual)
+            worst = np.max(np.abs(metrics.error(sim.targets[start:n], actual[start:n])))
+            if not cost <= limit or not worst <= bound:
+                return np.inf, n
+    finally:
+        sim.finish()
+    return float(cost), sim.cycles
+
+
+def _evaluate_chunk(sim_factory, metric, bound, check, selected, chunk):
+    # `selected` holds the parents' costs; the limit is the cost of the last
+    # candidate that would still be selected, and tightens as offspring finish
+    costs = sorted(selected)
+    results = []
+    for gains in chunk:
+        cost, steps = evaluate(sim_factory, gains, metric, costs[-1], bound, check)
+        results.append((cost, steps))
+        if cost < costs[-1]:
+            bisect.insort(costs, cost)
+            costs.pop()
+    return results
+
+
+def _map(pool, processes, sim_factory, metric, bound, check, selected, candidates):
+    if pool is None:
+        return _evaluate_chunk(sim_factory, metric, bound, check, selected, candidates)
+    size = max(1, -(-len(candidates) // processes))
+    chunks = [candidates[k:k + size] for k in range(0, len(candidates), size)]
+    n = len(chunks)
+    done = pool.map(_evaluate_chunk, [sim_factory] * n, [metric] * n, [bound] * n, [check] * n,
+                    [selected] * n, chunks)
+    return [r for chunk in done for r in chunk]
+
+
+def optimize(sim_factory, metric=metrics.iae, generations=15, population=16, parents=4, sigma=0.2,
+             bound=np.inf, check=0.5, seed=None, processes=None, **ranges):
+    """
+    Minimize `metric` over the PID gains of sim_factory() (a TargetedSimulation).
+    Gains given as (low, high) are searched within that range, scalar gains are
+    held fixed and missing gains are 0. Each generation mutates the `parents`
+    best candidates into `population` offspring with normal steps of `sigma`
+    times each range, widening the steps after an improving generation and
+    narrowing them otherwise. sim_factory and metric must be picklable.
+
+    Returns every evaluated Candidate, best first.
+    """
+    unknown = set(ranges) - set(GAINS)
+    assert not unknown, f'unknown gains: {sorted(unknown)}'
+    bounds = {g: tuple(r) for g, r in ranges.items() if np.ndim(r) == 1}
+    assert bounds, 'give at least one gain as a (low, high) range'
+    names = list(bounds)
+    low = np.array([bounds[g][0] for g in names], dtype=float)
+    high = np.array([bounds[g][1] for g in names], dtype=float)
+    fixed = {g: float(ranges.get(g, 0)) for g in GAINS if g not in bounds}
+    rng = np.random.default_rng(seed)
+
+    def gains_of(x):
+        values = dict(fixed)
+        values.update(zip(names, low + x * (high - low)))
+        return tuple(values[g] for g in GAINS)
+
+    processes = min(processes or os.cpu_count() or 1, population)
+    pool = ProcessPoolExecutor(processes) if processes > 1 else None
+    try:
+        xs = rng.random((population, len(names)))
+        selected = [np.inf] * parents
+        results = []
+        points = []
+        best = np.inf
+        for _ in range(generations):
+            candidates = [gains_of(x) for x in xs]
+            scored = _map(pool, processes, sim_factory, metric, bound, check, selected, candidates)
+            results.extend(Candidate(cost, *gains, steps) for (cost, steps), gains in zip(scored, candidates))
+            points.extend(xs)
+            order = sorted(range(len(results)), key=lambda k: results[k].score)[:parents]
+            selected = [results[k].score for k in order]
+            sigma = sigma * 1.2 if selected[0] < best else sigma * 0.7
+            best = selected[0]
+
+            chosen = np.array([points[k] for k in order])
+            mutated = chosen[rng.integers(len(chosen), size=population)]
+            xs = np.clip(mutated + rng.normal(0, sigma, mutated.shape), 0, 1)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return sorted(results, key=lambda r: r.score)
+
+
+def main():
+    import time
+
+    from quarticpositionpid import QuarticPositionSimulation
+    from tuner import format_table
+
+    start = time.perf_counter()
+    results = optimize(QuarticPositionSimulation, metrics.iae, generations=8, population=12, seed=1,
+                       p=(0.1, 3), i=(0, 3), d=(0, 3), f=0.15)
+    elapsed = time.perf_counter() - start
+    full = QuarticPositionSimulation().cycles * len(results)
+    simulated = sum(r.steps for r in results)
+    aborted = sum(not np.isfinite(r.score) for r in results)
+    print(format_table([r[:5] for r in results]))
+    print(f'{len(results)} candidates in {elapsed:.1f} s, {aborted} stopped early; '
+          f'simulated {simulated / full:.0%} of the steps of full runs')
+
+
+if __name__ == '__main__':
+    main()
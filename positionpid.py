@@ -1,13 +1,16 @@
 import control
-import graphutils
+import schedules
 from models import *
 
 
+TARGETS = schedules.piecewise((0, 0), (3, 6), (10, -4), (15, 0))
+
+
 class PositionSimulation(control.TargetedSimulation):
 
     def __init__(self):
         super().__init__(20)
-        self.flywheel = Flywheel(0.01, 0, kin_fric=0.01)
+        self.flywheel = Flywheel(0.01, kin_fric=0.01)
         self.motor = Motor(self.flywheel, 11, .65)
         self.pid = PID(0.3, 0.00, 0.2)
         
@@ -15,21 +18,16 @@ class PositionSimulation(control.TargetedSimulation):
         self.add_flywheel(self.flywheel)
         self.add_motor(self.motor)
 
-    def get_target(self, i, t, dt):
-        if t < 3:
-            return 0
-        elif t < 10:
-            return 6
-        elif t < 15:
-            return -4
-        else:
-            return 0
+    def get_targets(self, frames):
+        return schedules.tabulate(TARGETS, frames)[0]
 
     def loop(self, i, t, dt):
         self.motor.power = self.pid.push_error(self.target - self.flywheel.pos, dt)
 
 
 def main():
+    import graphutils
+
     sim = PositionSimulation()
     sim.simulate()
 
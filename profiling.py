@@ -0,0 +1,151 @@
+from collections import defaultdict
+import contextlib
+import sys
+import time
+import tracemalloc
+
+_MISSING = object()
+
+
+class PhaseProfiler:
+    """
+    Opt-in instrumentation for Simulation.simulate. Assign one to
+    Simulation.profiler and every phase of the step loop (raw_loop, the controller
+    loop, Flywheel.step, Motor.step, history writes and an integrator's solve) is
+    timed and counted for that run. Times are exclusive: history writes are not
+    counted again under the step that made them.
+
+    Nothing is wrapped while no profiler is attached, so an unprofiled run pays
+    nothing. Hooks added with add_hook are called as hook(phase, 'enter') and
+    hook(phase, 'exit') around every call, which lets external profilers attach
+    to individual phases.
+
+    Simulation.start and finish attach and detach an assigned profiler; to
+    profile part of a run by hand, use `with profiler.attached(sim):`, which
+    restores the patched methods however the block ends.
+    """
+
+    def __init__(self, trace_memory=False, report=True, out=None):
+        self.trace_memory = trace_memory
+        self.report = report
+        self.out = out
+        self.hooks = []
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.allocated = defaultdict(int)
+        self.wall = 0
+        self._stack = []
+        self._wrapped = []
+        self._started = None
+        self._owns_tracing = False
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def wrap(self, phase, fn):
+        """fn, timed under `phase` on every call."""
+        clock = time.perf_counter
+        stack = self._stack
+        trace = self.trace_memory
+        hooks = self.hooks
+
+        def timed(*args, **kwargs):
+            for hook in hooks:
+                hook(phase, 'enter')
+            # Time and memory spent in nested phases, subtracted from this one
+            children = [0, 0]
+            stack.append(children)
+            memory = tracemalloc.get_traced_memory()[0] if trace else 0
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                allocated = tracemalloc.get_traced_memory()[0] - memory if trace else 0
+                stack.pop()
+                self.times[phase] += elapsed - children[0]
+                self.allocated[phase] += allocated - children[1]
+                self.calls[phase] += 1
+                if stack:
+                    stack[-1][0] += elapsed
+                    stack[-1][1] += allocated
+                for hook in hooks:
+                    hook(phase, 'exit')
+        return timed
+
+    def _patch(self, obj, name, phase):
+        # Keep what the instance itself had (e.g. a loop set by bridge.serve) to put back
+        self._wrapped.append((obj, name, vars(obj).get(name, _MISSING)))
+        setattr(obj, name, self.wrap(phase, getattr(obj, name)))
+
+    def _unpatch(self):
+        while self._wrapped:
+            obj, name, previous = self._wrapped.pop()
+            if previous is _MISSING:
+                vars(obj).pop(name, None)
+            else:
+                setattr(obj, name, previous)
+
+    @contextlib.contextmanager
+    def attached(self, sim):
+        """Profile sim for the duration of the block."""
+        self.attach(sim)
+        try:
+            yield self
+        finally:
+            self.detach(sim)
+
+    def attach(self, sim):
+        try:
+            self._patch(sim, 'raw_loop', 'raw_loop')
+            self._patch(sim, 'loop', 'loop')
+            if hasattr(sim.integrator, 'solve'):
+                self._patch(sim.integrator, 'solve', 'integrate')
+            for f in sim.flywheels:
+                self._patch(f, 'step', 'flywheel.step')
+            for m in sim.motors:
+                self._patch(m, 'step', 'motor.step')
+            for model in sim.flywheels + sim.motors:
+                self._patch(model.history, 'append', 'history')
+                self._patch(model.history, 'extend', 'history')
+            if hasattr(sim, 'target_history'):
+                self._patch(sim.target_history, 'append', 'history')
+        except BaseException:
+            self._unpatch()
+            raise
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        else:
+            self._owns_tracing = False
+        self._started = time.perf_counter()
+
+    def detach(self, sim):
+        """Restore the patched methods and report. Does nothing if not attached."""
+        if self._started is None:
+            return
+        self._unpatch()
+        self.wall += time.perf_counter() - self._started
+        self._started = None
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+        if self.report:
+            print(self.summary(), file=self.out or sys.stdout)
+
+    def summary(self):
+        lines = [f'{"phase":16} {"calls":>10} {"total s":>10} {"us/call":>9} {"share":>7}'
+                 + (f' {"alloc KiB":>10}' if self.trace_memory else '')]
+        for phase in sorted(self.times, key=self.times.get, reverse=True):
+            total = self.times[phase]
+            calls = self.calls[phase]
+            line = f'{phase:16} {calls:10d} {total:10.4f} {1e6 * total / calls:9.2f} {total / self.wall:7.1%}'
+            if self.trace_memory:
+                line += f' {self.allocated[phase] / 1024:10.1f}'
+            lines.append(line)
+        other = self.wall - sum(self.times.values())
+        lines.append(f'{"(loop overhead)":16} {"":10} {other:10.4f} {"":9} {other / self.wall:7.1%}')
+        lines.append(f'{"total":16} {"":10} {self.wall:10.4f}')
+        return '\n'.join(lines)
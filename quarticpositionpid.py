@@ -1,5 +1,4 @@
 import control
-import graphutils
 from models import *
 
 
@@ -11,10 +10,10 @@ class QuarticPositionSimulation(control.TargetedSimulation):
         self.motor = Motor(self.flywheel, 11, .65)
         self.pid = PID(0.6, 1, 0.8, 0.15)
 
-    def get_target(self, i, t, dt):
+    def get_targets(self, t):
         return 0.005 * (t - 7.27) * (t - 15.67) * (t - 18.7) * t
 
-    def get_derivative(self, i, t, dt):
+    def get_derivatives(self, t):
         return 0.005 * (4 * t**3 - 124.92 * t**2 + 1085.7978 * t - 2130.32083)
 
     def init(self):
@@ -26,6 +25,8 @@ class QuarticPositionSimulation(control.TargetedSimulation):
 
 
 def main():
+    import graphutils
+
     sim = QuarticPositionSimulation()
     sim.simulate()
 
@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+class TickStats:
+    """Timing of every control tick of a real-time run, in seconds of wall time."""
+
+    def __init__(self, period):
+        self.period = period
+        self.starts = []  # when each tick started, relative to the run's start
+        self.latencies = []  # how late each tick started
+        self.controller = []  # time spent in the controller
+        self.busy = []  # controller plus physics
+        self.overruns = 0  # ticks that finished after the next one was due
+        self.skipped = 0  # controller ticks dropped to catch up
+
+    def add(self, start, latency, controller, busy):
+        self.starts.append(start)
+        self.latencies.append(latency)
+        self.controller.append(controller)
+        self.busy.append(busy)
+        if latency + busy > self.period:
+            self.overruns += 1
+
+    @property
+    def jitter(self):
+        """Standard deviation of the intervals between tick starts."""
+        if len(self.starts) < 3:
+            return 0.0
+        return float(np.std(np.diff(self.starts)))
+
+    def summary(self):
+        if not self.latencies:
+            return f'ticks      0 run, {self.skipped} skipped (period {self.period * 1e3:.2f} ms)'
+        latencies = np.array(self.latencies) * 1e3
+        controller = np.array(self.controller) * 1e3
+        busy = np.array(self.busy) * 1e3
+        return '\n'.join([
+            f'ticks      {len(latencies)} run, {self.skipped} skipped, {self.overruns} overrun '
+            f'(period {self.period * 1e3:.2f} ms)',
+            f'latency    mean {latencies.mean():.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms, '
+            f'max {latencies.max():.3f} ms',
+            f'jitter     {self.jitter * 1e3:.3f} ms',
+            f'controller mean {controller.mean():.3f} ms, max {controller.max():.3f} ms',
+            f'busy       mean {busy.mean():.3f} ms, max {busy.max():.3f} ms',
+        ])
+
+
+class RealtimeRunner:
+    """
+    Runs a simulation paced to the wall clock, with one control tick every
+    1 / control_frequency seconds (divided by `speed`). At each tick the awaited
+    `controller(sim, i, t, dt)` coroutine replaces sim.loop, then the physics of
+    the whole control period is advanced in one batch by the simulation's
+    integrator.
+
+    When the run falls more than a period behind and drop_late is set, the missed
+    controller ticks are skipped, their outputs held, and their physics is
+    advanced together with the current period so the run catches up. Otherwise
+    every tick runs, late, until the schedule is met again.
+    """
+
+    def __init__(self, sim, controller=None, speed=1, drop_late=True):
+        self.sim = sim
+        self.controller = controller
+        self.speed = speed
+        self.drop_late = drop_late
+        self.stats = None
+
+    async def _default_controller(self, sim, i, t, dt):
+        self._loop(i, t, dt)
+
+    async def run(self):
+        sim = self.sim
+        k = sim.steps_per_control
+        period = k * sim.step / self.speed
+        self.stats = stats = TickStats(period)
+        controller = self.controller or self._default_controller
+
+        sim.start()
+        self._loop = sim.loop
+        raw_loop = sim.raw_loop
+        ticked = [None]
+
+        # raw_loop of a tick's first step runs before the controller, so the
+        # integrator must not run it again; the controller replaces loop.
+        def paced_raw_loop(i, t, dt):
+            if i != ticked[0]:
+                raw_loop(i, t, dt)
+        sim.raw_loop = paced_raw_loop
+        sim.loop = lambda i, t, dt: None
+
+        clock = asyncio.get_running_loop().time
+        start = clock()
+        try:
+            tick = 0
+            while sim.cursor < sim.cycles:
+                due = start + tick * period
+                now = clock()
+                if now < due:
+                    await asyncio.sleep(due - now)
+                    now = clock()
+                behind = int((now - due) / period)
+                if self.drop_late and behind > 0:
+                    stats.skipped += behind
+                    tick += behind
+                    due += behind * period
+
+                i = tick * k
+                if i >= sim.cycles:
+                    # The last ticks were skipped; their physics still runs, outputs held
+                    sim.advance()
+                    break
+                t = sim.frames_between(i, i + 1)[0]
+                began = clock()
+                if sim.cursor < i:
+                    # Physics of skipped ticks, with the controller's outputs held
+                    sim.advance(i)
+                if sim.cursor == sim._prepared:
+                    # raw_loop reads the per-step inputs of the window the tick starts
+                    sim._prepare()
+                raw_loop(i, t, sim.step)
+                ticked[0] = i
+                await controller(sim, tick, t, sim.step * k)
+                controlled = clock()
+                sim.advance(min(i + k, sim.cycles))
+                stats.add(began - start, began - due, controlled - began, clock() - began)
+                tick += 1
+        finally:
+            del sim.raw_loop
+            del sim.loop
+            sim.finish()
+        return stats
+
+    def simulate(self):
+        """Run to completion on a fresh event loop and return the TickStats."""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run())
+        finally:
+            loop.close()
+
+
+def main():
+    from disturbedspeedpid import DisturbedSpeedSimulation
+
+    sim = DisturbedSpeedSimulation()
+    sim.set_timing(duration=3)
+
+    async def controller(sim, i, t, dt):
+        # Stands in for a robot controller that reads sensors over the network
+        await asyncio.sleep(0.001)
+        sim.motor.power = sim.pid.push_error(sim.target - sim.flywheel.vel, dt)
+
+    runner = RealtimeRunner(sim, controller)
+    wall = time.perf_counter()
+    stats = runner.simulate()
+    print(f'{sim.duration} s simulated in {time.perf_counter() - wall:.2f} s of wall time')
+    print(stats.summary())
+
+
+if __name__ == '__main__':
+    main()
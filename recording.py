@@ -0,0 +1,252 @@
+import json
+import os
+
+import numpy as np
+
+from models import FlywheelState, MotorState, TargetState
+
+META = 'meta.json'
+
+
+class StreamingHistory:
+    """
+    History that streams rows to one raw binary file per field. Only `chunk` rows
+    are buffered in memory; full chunks are appended to disk. Columns are read back
+    through np.memmap, so memory use does not grow with the length of the run.
+    """
+
+    def __init__(self, row_type, directory, name, chunk=65536, shape=()):
+        self.row_type = row_type
+        self.shape = shape
+        self.name = name
+        self.paths = [os.path.join(directory, f'{name}.{field}.bin') for field in row_type._fields]
+        self._index = {field: i for i, field in enumerate(row_type._fields)}
+        self._files = [open(p, 'wb') for p in self.paths]
+        self._buffer = [np.empty((chunk,) + shape) for _ in row_type._fields]
+        self._buffered = 0
+        self._flushed = 0
+        self._maps = {}  # field: (rows, memmap)
+
+    def __len__(self):
+        return self._flushed + self._buffered
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('history index out of range')
+        return self.row_type(*(self.column(f)[i] for f in self.row_type._fields))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def reserve(self, rows):
+        pass
+
+    def append(self, *values):
+        n = self._buffered
+        for b, v in zip(self._buffer, values):
+            b[n] = v
+        self._buffered = n + 1
+        if self._buffered == len(self._buffer[0]):
+            self.flush()
+
+    def extend(self, *columns):
+        rows = len(columns[0])
+        start = 0
+        while start < rows:
+            n = self._buffered
+            take = min(rows - start, len(self._buffer[0]) - n)
+            for b, c in zip(self._buffer, columns):
+                b[n:n + take] = c[start:start + take]
+            self._buffered = n + take
+            start += take
+            if self._buffered == len(self._buffer[0]):
+                self.flush()
+
+    def flush(self):
+        if self._buffered == 0 or self._files is None:
+            return
+        for f, b in zip(self._files, self._buffer):
+            f.write(b[:self._buffered].tobytes())
+            f.flush()
+        self._flushed += self._buffered
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if self._files is not None:
+            for f in self._files:
+                f.close()
+            self._files = None
+            self._buffer = None
+
+    def column(self, name):
+        self.flush()
+        rows, mapped = self._maps.get(name, (None, None))
+        if rows != self._flushed:
+            mapped = _map(self.paths[self._index[name]], self._flushed, self.shape)
+            self._maps[name] = (self._flushed, mapped)
+        return mapped
+
+    def meta(self):
+        return {'fields': list(self.row_type._fields), 'shape': list(self.shape), 'rows': len(self)}
+
+
+class RecordedHistory:
+    """Read-only, lazily memory-mapped history reopened from a recording."""
+
+    def __init__(self, directory, name, meta):
+        self.name = name
+        self.fields = meta['fields']
+        self.shape = tuple(meta['shape'])
+        self.rows = meta['rows']
+        self._directory = directory
+        self._maps = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        if name not in self._maps:
+            path = os.path.join(self._directory, f'{self.name}.{name}.bin')
+            self._maps[name] = _map(path, self.rows, self.shape)
+        return self._maps[name]
+
+
+def _map(path, rows, shape):
+    if rows == 0:
+        return np.empty((0,) + tuple(shape))
+    return np.memmap(path, dtype=float, mode='r', shape=(rows,) + tuple(shape))
+
+
+class Recorder:
+    """
+    Streams a simulation's histories to `directory` while it runs. Assign one to
+    Simulation.recorder before simulate(); reopen the results with Recording.
+    The simulation then also computes its per-step inputs (targets,
+    disturbances...) one chunk at a time, so a run's memory use does not depend
+    on its duration.
+    """
+
+    def __init__(self, directory, chunk=65536):
+        self.directory = directory
+        self.chunk = chunk
+        self.histories = []
+        self._meta = {}
+
+    @property
+    def window(self):
+        return self.chunk
+
+    def _history(self, row_type, name, shape=()):
+        history = StreamingHistory(row_type, self.directory, name, self.chunk, shape)
+        self.histories.append(history)
+        return history
+
+    def attach(self, sim):
+        os.makedirs(self.directory, exist_ok=True)
+        self.histories = []
+        for k, f in enumerate(sim.flywheels):
+            f.history = self._history(FlywheelState, f'flywheel{k}', getattr(f.history, 'shape', ()))
+            if hasattr(f, 'motor_history'):
+                # A drivetrain keeps its motors' history itself
+                f.motor_history = self._history(MotorState, f'drivetrain{k}', f.motor_history.shape)
+        for k, m in enumerate(sim.motors):
+            m.history = self._history(MotorState, f'motor{k}', getattr(m.history, 'shape', ()))
+        motors = [sim.flywheels.index(m.flywheel) if m.flywheel in sim.flywheels else None for m in sim.motors]
+
+        if hasattr(sim, 'target_history'):
+            sim.target_history = self._history(TargetState, 'targets')
+
+        self._meta = {'step': sim.step, 'cycles': sim.cycles, 'motors': motors}
+
+    def close(self):
+        for h in self.histories:
+            h.close()
+        meta = dict(self._meta, histories={h.name: h.meta() for h in self.histories})
+        with open(os.path.join(self.directory, META), 'w') as f:
+            json.dump(meta, f)
+
+
+class _RecordedFlywheel:
+
+    def __init__(self, history):
+        self.history = history
+
+    @property
+    def velocities(self):
+        return self.history.column('vel')
+
+    @property
+    def positions(self):
+        return self.history.column('pos')
+
+    @property
+    def accelerations(self):
+        return self.history.column('acc')
+
+
+class _RecordedDrivetrain(_RecordedFlywheel):
+
+    def __init__(self, history, motor_history):
+        super().__init__(history)
+        self.motor_history = motor_history
+
+    @property
+    def powers(self):
+        return self.motor_history.column('power')
+
+    @property
+    def torques(self):
+        return self.motor_history.column('torque')
+
+
+class _RecordedMotor:
+
+    def __init__(self, history, flywheel):
+        self.history = history
+        self.flywheel = flywheel
+
+    @property
+    def powers(self):
+        return self.history.column('power')
+
+    @property
+    def torques(self):
+        return self.history.column('torque')
+
+
+class Recording:
+    """
+    A finished recording. flywheels and motors expose the same history accessors
+    as the live models, so they can be passed straight to graphutils.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META)) as f:
+            meta = json.load(f)
+        self.step = meta['step']
+        self.cycles = meta['cycles']
+        histories = {name: RecordedHistory(directory, name, m) for name, m in meta['histories'].items()}
+        self.flywheels = [_RecordedDrivetrain(histories[f'flywheel{k}'], histories[f'drivetrain{k}'])
+                          if f'drivetrain{k}' in histories else _RecordedFlywheel(histories[f'flywheel{k}'])
+                          for k in range(sum(name.startswith('flywheel') for name in histories))]
+        self.motors = [_RecordedMotor(histories[f'motor{k}'], self.flywheels[f] if f is not None else None)
+                       for k, f in enumerate(meta['motors'])]
+        self._targets = histories.get('targets')
+        self._frames = None
+
+    @property
+    def frames(self):
+        if self._frames is None:
+            self._frames = np.arange(self.cycles) * self.step
+        return self._frames
+
+    @property
+    def targets(self):
+        return self._targets.column('target')
+
+    @property
+    def derivatives(self):
+        return self._targets.column('derivative')
@@ -0,0 +1,79 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import graphutils
+
+RenderJob = namedtuple('RenderJob', ('path', 'layout', 'title', 'frames', 'series'))
+
+# One figure per layout and process, refilled for every render
+_templates = {}
+
+
+def _template(layout, figsize, dpi):
+    key = (layout, figsize, dpi)
+    if key not in _templates:
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        _templates[key] = graphutils.LAYOUTS[layout](fig)
+    return _templates[key]
+
+
+def job(path, layout, title, motor, frames, targets=None, derivatives=None):
+    """A RenderJob for a simulation's motor, holding only the arrays the graph needs."""
+    return RenderJob(path, layout, title, frames, graphutils.series_of(motor, targets, derivatives))
+
+
+def render(job, figsize=(6.4, 4.8), dpi=100):
+    """
+    Draw one graph off-screen with the Agg canvas and save it to job.path. The
+    format follows the file extension (png, svg, pdf, ...).
+    """
+    template = _template(job.layout, figsize, dpi)
+    template.fill(job.title, job.frames, job.series)
+    template.figure.savefig(job.path)
+    return job.path
+
+
+def _render_all(jobs, figsize, dpi):
+    return [render(j, figsize, dpi) for j in jobs]
+
+
+def render_many(jobs, processes=None, figsize=(6.4, 4.8), dpi=100):
+    """
+    Render jobs across a process pool and return their paths in the order of
+    `jobs`. Each worker renders a contiguous run of jobs and reuses its own
+    figure templates.
+    """
+    jobs = list(jobs)
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        return _render_all(jobs, figsize, dpi)
+
+    size = -(-len(jobs) // processes)
+    chunks = [jobs[k:k + size] for k in range(0, len(jobs), size)]
+    n = len(chunks)
+    with ProcessPoolExecutor(processes) as pool:
+        done = pool.map(_render_all, chunks, [figsize] * n, [dpi] * n)
+        return [path for chunk in done for path in chunk]
+
+
+def main():
+    from quarticpositionpid import QuarticPositionSimulation
+    from splinepositionpid import SplinePositionSimulation
+
+    jobs = []
+    for cls in (QuarticPositionSimulation, SplinePositionSimulation):
+        sim = cls()
+        sim.simulate()
+        jobs.append(job(f'{cls.__name__}.png', 'ff_target', cls.__name__, sim.motor,
+                        sim.frames, sim.targets, sim.derivatives))
+    for path in render_many(jobs):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
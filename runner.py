@@ -0,0 +1,164 @@
+"""
+Run the scenarios headless and print their metrics.
+
+    python runner.py                           # every scenario
+    python runner.py positionpid --p 0.5 --d 0.3 --duration 10
+    python runner.py --plot out/               # also save a graph of each run
+
+Plotting libraries are only imported when --plot is given.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import inspect
+import os
+import sys
+import time
+
+import control
+import metrics
+from integrators import AdaptiveIntegrator, AnalyticIntegrator, EulerIntegrator
+
+SCENARIO_MODULES = ('positionpid', 'quarticpositionpid', 'splinepositionpid', 'disturbedspeedpid', 'frictiontest')
+
+INTEGRATORS = {
+    'euler': EulerIntegrator,
+    'analytic': AnalyticIntegrator,
+    'adaptive': AdaptiveIntegrator,
+}
+
+GAINS = ('p', 'i', 'd', 'f')
+
+
+def discover(modules=SCENARIO_MODULES):
+    """{name: (module, class name)} of every concrete Simulation defined in the modules."""
+    found = {}
+    for name in modules:
+        module = importlib.import_module(name)
+        for cls_name, cls in inspect.getmembers(module, inspect.isclass):
+            if (issubclass(cls, control.Simulation) and cls.__module__ == name
+                    and not inspect.isabstract(cls)):
+                found[cls_name] = (name, cls_name)
+    return found
+
+
+def summarize(sim):
+    """Summary numbers for a finished single-flywheel run."""
+    flywheel, motor = sim.flywheel, sim.motor
+    result = {
+        'final pos': float(flywheel.pos),
+        'final vel': float(flywheel.vel),
+        'effort': metrics.control_effort(sim.frames, motor.powers),
+        'saturated': metrics.saturation_fraction(motor.powers),
+    }
+    if isinstance(sim, control.TargetedSimulation):
+        actual = flywheel.positions if sim.tracks == 'pos' else flywheel.velocities
+        tracking = metrics.tracking(sim.frames, sim.targets, actual)
+        result['IAE'] = tracking['IAE']
+        result['max error'] = tracking['max error']
+    return result
+
+
+def run(module, cls_name, timing=None, gains=None, integrator=None, plot=None):
+    """Simulate one scenario with the given overrides and return (name, metrics, seconds)."""
+    sim = getattr(importlib.import_module(module), cls_name)()
+    if timing:
+        sim.set_timing(**timing)
+    if gains:
+        if not hasattr(sim, 'pid'):
+            raise ValueError(f'{cls_name} has no PID to set gains on')
+        for gain, value in gains.items():
+            setattr(sim.pid, gain, value)
+    if integrator:
+        sim.integrator = INTEGRATORS[integrator]()
+
+    start = time.perf_counter()
+    sim.simulate()
+    elapsed = time.perf_counter() - start
+
+    if plot:
+        import graphutils
+        import render
+        path = os.path.join(plot, f'{cls_name}.png')
+        targeted = isinstance(sim, control.TargetedSimulation)
+        render.render(render.job(path, graphutils.layout_for(sim), cls_name, sim.motor, sim.frames,
+                                 sim.targets if targeted else None,
+                                 sim.derivatives if targeted else None))
+    return cls_name, summarize(sim), elapsed
+
+
+def _run(args):
+    return run(*args)
+
+
+def format_results(results):
+    columns = []
+    for _, values, _ in results:
+        columns.extend(c for c in values if c not in columns)
+    lines = [f'{"scenario":28}' + ''.join(f'{c:>12}' for c in columns) + f'{"seconds":>10}']
+    for name, values, elapsed in results:
+        cells = ''.join(f'{values[c]:12.4g}' if c in values else f'{"":>12}' for c in columns)
+        lines.append(f'{name:28}{cells}{elapsed:10.3f}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help='scenario classes or modules (default: all)')
+    parser.add_argument('--list', action='store_true', help='list the scenarios and exit')
+    parser.add_argument('--duration', type=float)
+    parser.add_argument('--step', type=float)
+    parser.add_argument('--control-frequency', type=float)
+    for gain in GAINS:
+        parser.add_argument(f'--{gain}', type=float, help=f'PID {gain} gain')
+    parser.add_argument('--integrator', choices=sorted(INTEGRATORS))
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--plot', metavar='DIR', help='save a graph of each run to DIR')
+    args = parser.parse_args()
+
+    scenarios = discover()
+    if args.list:
+        for name, (module, _) in sorted(scenarios.items()):
+            print(f'{name:28} {module}')
+        return
+
+    selected = []
+    for name in args.names or scenarios:
+        matches = [k for k, (module, _) in scenarios.items() if name.lower() in (k.lower(), module)]
+        if not matches:
+            parser.error(f'unknown scenario {name!r} (see --list)')
+        selected.extend(m for m in matches if m not in selected)
+
+    timing = {k: v for k, v in (('duration', args.duration), ('step', args.step),
+                                ('control_frequency', args.control_frequency)) if v is not None}
+    gains = {g: getattr(args, g) for g in GAINS if getattr(args, g) is not None}
+    if args.plot:
+        os.makedirs(args.plot, exist_ok=True)
+    # Check the overrides against every scenario before starting any run
+    jobs = []
+    for module, cls_name in (scenarios[name] for name in selected):
+        sim = getattr(importlib.import_module(module), cls_name)()
+        if timing:
+            try:
+                sim.set_timing(**timing)
+            except ValueError as e:
+                parser.error(f'{cls_name}: {e}')
+        scenario_gains = gains
+        if gains and not hasattr(sim, 'pid'):
+            if args.names:
+                parser.error(f'{cls_name} has no PID to set gains on')
+            print(f'{cls_name} has no PID: running it without the gain overrides', file=sys.stderr)
+            scenario_gains = None
+        jobs.append((module, cls_name, timing, scenario_gains, args.integrator, args.plot))
+
+    processes = min(args.processes or os.cpu_count() or 1, len(jobs))
+    if processes <= 1:
+        results = [_run(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_run, jobs))
+    print(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
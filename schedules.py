@@ -0,0 +1,175 @@
+"""
+Declarative schedules for targets and external torques.
+
+A schedule is plain data, so scenarios can be written as JSON or built with
+the helpers below:
+
+    3.5                                   constant
+    {"piecewise": [[0, 0], [3, 6]]}       0 from t=0, 6 from t=3 on
+    {"ramp": [[0, 0], [2, 10]]}           linear between points, held outside them
+    {"spline": [[0, 0], [30, 5]]}         cubic Hermite through the points (zero tangents)
+    {"sum": [schedule, ...]}
+    {"scale": [factor, schedule]}
+
+tabulate() turns a schedule into value and derivative arrays over a run's
+frames once, so the step loop only indexes into them.
+"""
+import json
+
+import numpy as np
+
+import control
+import mathutils
+from models import Flywheel, Motor, PID
+
+
+def piecewise(*points):
+    return {'piecewise': [list(p) for p in points]}
+
+
+def ramp(*points):
+    return {'ramp': [list(p) for p in points]}
+
+
+def spline(*points):
+    return {'spline': [list(p) for p in points]}
+
+
+def total(*schedules):
+    return {'sum': list(schedules)}
+
+
+def scale(factor, schedule):
+    return {'scale': [factor, schedule]}
+
+
+def _points(points):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    assert len(points) > 0, 'a schedule needs at least one point'
+    assert np.all(np.diff(points[:, 0]) > 0), 'schedule times must increase'
+    return points[:, 0], points[:, 1]
+
+
+def tabulate(schedule, frames):
+    """(values, derivatives) of the schedule at every frame."""
+    frames = np.asarray(frames, dtype=float)
+    if np.ndim(schedule) == 0 and not isinstance(schedule, dict):
+        return np.full(frames.shape, float(schedule)), np.zeros(frames.shape)
+    (kind, arg), = schedule.items()
+
+    if kind == 'piecewise':
+        times, values = _points(arg)
+        index = np.maximum(np.searchsorted(times, frames, 'right') - 1, 0)
+        return values[index], np.zeros(frames.shape)
+    if kind == 'ramp':
+        times, values = _points(arg)
+        slopes = np.append(np.diff(values) / np.diff(times), 0)
+        index = np.searchsorted(times, frames, 'right') - 1
+        inside = (index >= 0) & (index < len(times) - 1)
+        return np.interp(frames, times, values), np.where(inside, slopes[np.clip(index, 0, None)], 0)
+    if kind == 'spline':
+        times, values = _points(arg)
+        if len(times) == 1:
+            return np.full(frames.shape, values[0]), np.zeros(frames.shape)
+        curve = mathutils.Spline(*values)
+        # Position along the spline's unit-spaced points, and its rate per second
+        x = np.interp(frames, times, np.arange(len(times)))
+        index = np.clip(np.searchsorted(times, frames, 'right') - 1, 0, len(times) - 2)
+        rate = 1 / np.diff(times)[index]
+        return curve(x), curve.derivative(x) * rate
+    if kind == 'sum':
+        parts = [tabulate(s, frames) for s in arg]
+        return sum(p[0] for p in parts), sum(p[1] for p in parts)
+    if kind == 'scale':
+        factor, inner = arg
+        values, derivatives = tabulate(inner, frames)
+        return factor * values, factor * derivatives
+    raise ValueError(f'unknown schedule {kind!r}')
+
+
+class ScheduleSimulation(control.TargetedSimulation):
+    """
+    A single flywheel and motor under PID control, described entirely by data:
+
+        {"duration": 20, "control_frequency": 100, "tracks": "vel",
+         "flywheel": {"mass": 0.01, "kin_fric": 0.01},
+         "motor": {"max_vel": 556, "stall_torque": 2.42},
+         "pid": {"p": 1},
+         "targets": <schedule>, "torques": <schedule>}
+
+    Targets and external torques are compiled once per run. The schedule's
+    derivative is fed forward to the PID's f gain.
+    """
+
+    def __init__(self, description):
+        super().__init__(description['duration'], description.get('step', 0.001),
+                         description.get('control_frequency', 100))
+        self.description = description
+        self.tracks = description.get('tracks', 'pos')
+        self.flywheel = Flywheel(**description['flywheel'])
+        self.motor = Motor(self.flywheel, **description['motor'])
+        self.pid = PID(**description.get('pid', {'p': 1}))
+        self.torques = description.get('torques', 0)
+        self._torques = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def get_targets(self, frames):
+        return tabulate(self.description['targets'], frames)[0]
+
+    def get_derivatives(self, frames):
+        return tabulate(self.description['targets'], frames)[1]
+
+    def prepare(self, start, stop):
+        super().prepare(start, stop)
+        self._torques = tabulate(self.torques, self.frames_between(start, stop))[0] if self.torques else None
+
+    def resume(self):
+        # Only the remaining steps follow a change of torques
+        if self.torques or self._torques is not None:
+            torques = np.zeros(self._prepared - self.offset) if self._torques is None else np.array(self._torques)
+            torques[self.cursor - self.offset:] = tabulate(self.torques, self.frames_between(self.cursor, self._prepared))[0]
+            self._torques = torques
+        super().resume()
+
+    @property
+    def per_step_raw_loop(self):
+        return self._torques is not None or self._precomputed is None
+
+    def init(self):
+        self.add_flywheel(self.flywheel)
+        self.add_motor(self.motor)
+
+    def raw_loop(self, i, t, dt):
+        super().raw_loop(i, t, dt)
+        if self._torques is not None:
+            self.flywheel.apply_torque(self._torques[i - self.offset])
+
+    def loop(self, i, t, dt):
+        actual = self.flywheel.pos if self.tracks == 'pos' else self.flywheel.vel
+        self.motor.power = self.pid.push_error(self.target - actual, dt, self.derivative)
+
+
+def main():
+    import metrics
+
+    base = {
+        'duration': 20, 'tracks': 'vel',
+        'flywheel': {'mass': 0.01, 'kin_fric': 0.01, 'stat_fric': 0.02},
+        'motor': {'max_vel': 556, 'stall_torque': 2.42},
+        'pid': {'p': 1},
+        'targets': ramp((0, 0), (1, 100)),
+        'torques': piecewise((0, 0), (2, 0.5), (5, -1.5), (8, -2.1), (14, 0), (15, -4), (15.5, 0)),
+    }
+    for k in (0, 0.5, 1, 1.5):
+        sim = ScheduleSimulation(dict(base, torques=scale(k, base['torques'])))
+        sim.simulate()
+        iae = metrics.iae(sim.frames, sim.targets, sim.flywheel.velocities)
+        print(f'disturbance x{k}: velocity IAE {iae:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Parallel sweeps whose workers write histories straight into shared memory.
+
+The parent allocates one multiprocessing.shared_memory block shaped
+(runs, cycles, fields). Each worker's flywheel, motor and target histories are
+History.wrap views of its run's rows, so the physics loop appends directly into
+the block; nothing but an optional score per run is pickled back. The parent
+reads the block as a zero-copy 3-D array. Requires Python 3.8+.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+
+import numpy as np
+from multiprocessing import shared_memory
+
+import control
+from bridge import open_shared, release_shared
+from models import FlywheelState, History, MotorState, TargetState
+
+FIELDS = FlywheelState._fields + MotorState._fields + TargetState._fields
+
+
+class SharedRecorder:
+    """
+    Simulation.recorder that points one run's histories at its rows of the
+    shared (runs, cycles, fields) array.
+    """
+
+    def __init__(self, data, run):
+        self.data = data
+        self.run = run
+
+    def _columns(self, row_type):
+        return [self.data[self.run, :, FIELDS.index(f)] for f in row_type._fields]
+
+    def attach(self, sim):
+        assert len(sim.flywheels) == 1 and len(sim.motors) == 1, 'shared sweeps record one flywheel and one motor'
+        sim.flywheels[0].history = History.wrap(FlywheelState, self._columns(FlywheelState))
+        sim.motors[0].history = History.wrap(MotorState, self._columns(MotorState))
+        if isinstance(sim, control.TargetedSimulation):
+            sim.target_history = History.wrap(TargetState, self._columns(TargetState))
+
+    def close(self):
+        pass
+
+
+def apply(sim, settings):
+    """Set dotted attributes, e.g. {'pid.p': 0.5, 'flywheel.mass': 0.02}."""
+    for path, value in settings.items():
+        *owners, attr = path.split('.')
+        target = sim
+        for owner in owners:
+            target = getattr(target, owner)
+        setattr(target, attr, value)
+
+
+def grid(**ranges):
+    """Settings for every combination of the values in ranges, e.g. grid(**{'pid.p': [1, 2], 'pid.d': [0, 1]})."""
+    names = list(ranges)
+    values = (np.atleast_1d(ranges[n]).tolist() for n in names)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+# The shared array a worker process writes into
+_data = None
+_shm = None
+
+
+def _open(name, shape):
+    global _data, _shm
+    _shm = open_shared(name)
+    _data = np.ndarray(shape, np.float64, _shm.buf)
+
+
+def _run(sim_factory, cost, run, settings):
+    sim = sim_factory()
+    apply(sim, settings)
+    sim.recorder = SharedRecorder(_data, run)
+    sim.simulate()
+    return None if cost is None else float(cost(sim))
+
+
+def _run_chunk(sim_factory, cost, chunk):
+    return [_run(sim_factory, cost, run, settings) for run, settings in chunk]
+
+
+class SweepResult:
+    """
+    The (runs, cycles, fields) array of a sweep, backed by shared memory until
+    close(). field(name) gives a (cycles, runs) view, the layout metrics.py takes.
+    """
+
+    def __init__(self, shm, data, frames, settings, scores):
+        self._shm = shm
+        self.data = data
+        self.frames = frames
+        self.settings = settings
+        self.scores = scores
+
+    def field(self, name):
+        return self.data[:, :, FIELDS.index(name)].T
+
+    def close(self):
+        self.data = None
+        release_shared(self._shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def sweep(sim_factory, settings, cost=None, processes=None):
+    """
+    Run sim_factory() once per entry of `settings` (see apply and grid), with
+    the histories written into shared memory. sim_factory and cost must be
+    picklable. Fields a simulation does not record (targets, for untargeted
+    ones) are nan.
+    """
+    global _data
+    settings = list(settings)
+    probe = sim_factory()
+    shape = (len(settings), probe.cycles, len(FIELDS))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    data = np.ndarray(shape, np.float64, shm.buf)
+    data[:] = np.nan
+
+    runs = list(enumerate(settings))
+    processes = min(processes or os.cpu_count() or 1, len(runs))
+    try:
+        if processes <= 1:
+            _data = data
+            try:
+                scores = [_run(sim_factory, cost, run, s) for run, s in runs]
+            finally:
+                _data = None
+        else:
+            size = max(1, len(runs) // (4 * processes))
+            chunks = [runs[k:k + size] for k in range(0, len(runs), size)]
+            with ProcessPoolExecutor(processes, initializer=_open, initargs=(shm.name, shape)) as pool:
+                done = pool.map(_run_chunk, [sim_factory] * len(chunks), [cost] * len(chunks), chunks)
+                scores = [s for chunk in done for s in chunk]
+    except BaseException:
+        del data
+        release_shared(shm)
+        raise
+    return SweepResult(shm, data, probe.frames, settings, scores)
+
+
+def main():
+    import metrics
+    from quarticpositionpid import QuarticPositionSimulation
+
+    settings = grid(**{'pid.p': np.linspace(0.2, 1.5, 4), 'pid.d': np.linspace(0.2, 1.5, 4)})
+    with sweep(QuarticPositionSimulation, settings) as result:
+        print('shared array:', result.data.shape, 'runs x steps x', FIELDS)
+        iae = metrics.iae(result.frames, result.field('target'), result.field('pos'))
+        best = int(np.argmin(iae))
+        print(f'best of {len(settings)}: {result.settings[best]} IAE={iae[best]:.4f}')
+
+
+if __name__ == '__main__':
+    main()
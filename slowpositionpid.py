@@ -2,8 +2,6 @@ from models import *
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
 
 DURATION = 20
 STEP = 0.01
@@ -11,10 +9,10 @@ CYCLES = int(DURATION / STEP) + 1
 
 RADS = 0.1
 
-def main():
+def simulate():
 
-    f = Flywheel(0.01, 0, kin_fric=0.01)
-    m = Motor(f, 11, .65, min_power=0)
+    f = Flywheel(0.01, kin_fric=0.01)
+    m = Motor(f, 11, .65)
     p = PID(0.7, 0.00, 0.2, 0.25)
     
     frames = [t * STEP for t in range(0, CYCLES)]
@@ -26,8 +24,6 @@ def main():
     torques = []
     derivatives = []
 
-    print(CYCLES)
-    
     for t in frames:
         target = RADS * t
         vel = RADS  # Derivative of the above
@@ -43,6 +39,16 @@ def main():
         powers.append(m.power)
         targets.append(target)
     
+    return p, frames, positions, velocities, targets, derivatives, powers, torques
+
+
+def main():
+    import matplotlib.pyplot as plt
+    from matplotlib import gridspec
+
+    p, frames, positions, velocities, targets, derivatives, powers, torques = simulate()
+    print(CYCLES)
+
     gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
 
     plt.subplots_adjust(hspace=0.4)
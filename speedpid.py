@@ -2,16 +2,18 @@ from models import *
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-from matplotlib import gridspec
+import schedules
+
 
 DURATION = 20
 STEP = 0.001
 CYCLES = int(DURATION / STEP) + 1
 
-def main():
+TARGETS = schedules.piecewise((0, 0), (3, 300), (7, -200), (15, 0))
+
+def simulate():
 
-    f = Flywheel(0.01, 0, kin_fric=0.01)
+    f = Flywheel(0.01, kin_fric=0.01)
     m = Motor(f, 556, 2.42)
     p = PID(1, 0, 0)
     
@@ -24,17 +26,10 @@ def main():
 
     _impulses = []
 
-    print(CYCLES)
-    
-    for t in frames:
-        if t < 3:
-            target = 0
-        elif t < 7:
-            target = 300
-        elif t < 15:
-            target = -200
-        else:
-            target = 0
+    schedule = schedules.tabulate(TARGETS, frames)[0]
+
+    for k, t in enumerate(frames):
+        target = schedule[k]
         m.power = p.push_error(target - f.vel, STEP)
         #m.power = 1
         torques.append(m.torque)
@@ -45,6 +40,16 @@ def main():
         powers.append(m.power)
         targets.append(target)
     
+    return p, frames, velocities, targets, powers, torques
+
+
+def main():
+    import matplotlib.pyplot as plt
+    from matplotlib import gridspec
+
+    p, frames, velocities, targets, powers, torques = simulate()
+    print(CYCLES)
+
     gs = gridspec.GridSpec(2, 1, height_ratios=[2, 1])
 
     plt.subplots_adjust(hspace=0.4)
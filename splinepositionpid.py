@@ -1,6 +1,6 @@
 import control
-import graphutils
 import mathutils
+import metrics
 from models import *
 
 
@@ -16,14 +16,13 @@ class SplinePositionSimulation(control.TargetedSimulation):
         self.flywheel = Flywheel(0.5, kin_fric=0.1, stat_fric=0.2)
         self.motor = Motor(self.flywheel, 11, .65, deadzone=0)
         self.pid = PID(5, 1.2, 3, 1)
-        self.spline = lambda x: mathutils.Spline(*points)(x / time_between)
-        self.deriv = mathutils.derivative(self.spline, h=0.000001)
+        self.spline = mathutils.Spline(*points)
 
-    def get_target(self, i, t, dt):
-        return self.spline(t)
+    def get_targets(self, frames):
+        return self.spline(frames / time_between)
 
-    def get_derivative(self, i, t, dt):
-        return self.deriv(t)
+    def get_derivatives(self, frames):
+        return self.spline.derivative(frames / time_between) / time_between
 
     def init(self):
         self.add_flywheel(self.flywheel)
@@ -34,12 +33,14 @@ class SplinePositionSimulation(control.TargetedSimulation):
 
 
 def main():
+    import graphutils
+
     sim = SplinePositionSimulation()
     sim.simulate()
-    error = max(*((f, t - p) for f, t, p in zip(sim.frames, sim.targets, sim.flywheel.positions)), key=lambda x: x[1])[0]
+    error, when = metrics.max_error(sim.frames, sim.targets, sim.flywheel.positions)
 
     print(f'Cycles: {sim.cycles}')
-    print(f'Largest error: {error}')
+    print(f'Largest error: {error} at t={when}')
 
     title = f'''NeveRest 60 Spline Motion Processing PID Test (P={sim.pid.p}, I={sim.pid.i}, D={sim.pid.d}, F={sim.pid.f})
 Target function is a spline crossing points {points}
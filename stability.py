@@ -0,0 +1,185 @@
+"""
+Linearized, discrete-time model of a PID-controlled Motor and Flywheel.
+
+Away from saturation, zero velocity and the deadzone edge, a motor's torque is
+linear in power and velocity:
+
+    torque = stall_torque * ((1 - deadzone) * power - velocity / max_vel) + const
+
+Stepping it exactly like Simulation does (semi-implicit Euler, with the motor's
+torque reaching the flywheel one physics step later) gives per-step state
+matrices for [position, velocity, pending torque] (without position when
+velocity is tracked). Holding the power for a
+control period turns those into the plant the controller sees, and the PID's
+update gives its z-domain transfer function. Frequency responses, margins and
+closed-loop poles then follow from small matrix operations.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Margins = namedtuple('Margins', ('gain', 'gain_frequency', 'phase', 'phase_frequency'))
+
+
+class LinearModel:
+
+    def __init__(self, flywheel, motor, pid, step, steps_per_control, velocity=0, tracks='vel', pid_dt=None):
+        self.step = step
+        self.steps_per_control = steps_per_control
+        self.period = step * steps_per_control
+        self.pid = pid
+        # dt the controller passes to push_error, which some scenarios set to the physics step
+        self.pid_dt = pid_dt or self.period
+        self.tracks = tracks
+
+        self.velocity = velocity
+        gain = motor.stall_torque * (1 - motor.deadzone)  # d torque / d power
+        damping = motor.stall_torque / motor.max_vel  # -d torque / d velocity
+        # Power that holds `velocity` against kinetic friction and back-EMF
+        needed = flywheel.kin_fric / motor.stall_torque + abs(velocity) / motor.max_vel
+        self.power = float(np.sign(velocity)) * max(needed - motor.deadzone, 0) / (1 - motor.deadzone)
+        assert abs(self.power) <= 1, f'{velocity} rad/s needs power {self.power:.3f}, beyond saturation'
+
+        h, m = step, flywheel.mass
+        # One physics step: flywheel.step then motor.step
+        self.A = np.array([
+            [1, h, h * h / m],
+            [0, 1, h / m],
+            [0, -damping, -damping * h / m],
+        ])
+        self.B = np.array([0, 0, gain])
+        self.C = np.array([1.0, 0, 0])
+        if tracks != 'pos':
+            # Position does not feed back into velocity, so drop it
+            self.A, self.B, self.C = self.A[1:, 1:], self.B[1:], np.array([1.0, 0])
+
+        # Power held for a control period
+        n = len(self.B)
+        self.Ad = np.linalg.matrix_power(self.A, steps_per_control)
+        Bd = np.zeros(n)
+        power = np.eye(n)
+        for _ in range(steps_per_control):
+            Bd += power @ self.B
+            power = self.A @ power
+        self.Bd = Bd
+
+    @classmethod
+    def of(cls, sim, velocity=None, pid_dt=None):
+        """The model of a single-flywheel simulation, by default around its final target."""
+        if velocity is None:
+            velocity = float(sim.targets[-1]) if sim.tracks == 'vel' and len(sim.targets) else 0
+        return cls(sim.flywheel, sim.motor, sim.pid, sim.step, sim.steps_per_control,
+                   velocity, getattr(sim, 'tracks', 'vel'), pid_dt)
+
+    def frequencies(self, n=2000, lowest=None):
+        """Log-spaced angular frequencies (rad/s) up to the controller's Nyquist frequency."""
+        nyquist = np.pi / self.period
+        lowest = lowest or nyquist * 1e-5
+        return np.logspace(np.log10(lowest), np.log10(nyquist), n)
+
+    def _z(self, w):
+        return np.exp(1j * np.asarray(w, dtype=float) * self.period)
+
+    def plant(self, w):
+        """Plant frequency response C (zI - Ad)^-1 Bd from power to the tracked state."""
+        z = self._z(w)
+        n = len(self.Bd)
+        resolvent = z[:, None, None] * np.eye(n) - self.Ad
+        return np.linalg.solve(resolvent, np.broadcast_to(self.Bd, z.shape + (n,))[..., None])[..., 0] @ self.C
+
+    def controller(self, w):
+        """PID frequency response, matching PID.push_error's update."""
+        z = self._z(w)
+        p, i, d, dt = self.pid.p, self.pid.i, self.pid.d, self.pid_dt
+        return p + i * dt * z / (z - 1) + d * (z - 1) / (z * dt)
+
+    def open_loop(self, w):
+        return self.controller(w) * self.plant(w)
+
+    def bode(self, w=None):
+        """(frequencies, open-loop magnitude in dB, unwrapped phase in degrees)."""
+        w = self.frequencies() if w is None else np.asarray(w, dtype=float)
+        response = self.open_loop(w)
+        return w, 20 * np.log10(np.abs(response)), np.degrees(np.unwrap(np.angle(response)))
+
+    def nyquist(self, w=None):
+        """Open-loop response along the unit circle, from -Nyquist to +Nyquist frequency."""
+        w = self.frequencies() if w is None else np.asarray(w, dtype=float)
+        response = self.open_loop(w)
+        return np.concatenate((np.conj(response[::-1]), response))
+
+    def margins(self, w=None):
+        """
+        Gain margin (as a factor) at the phase crossover and phase margin (degrees)
+        at the gain crossover, with their frequencies. Missing crossovers give inf.
+        """
+        w, magnitude, phase = self.bode(w)
+        gain, gain_frequency = np.inf, np.nan
+        # Phase crossings of -180 - 360k degrees. A real negative response at the
+        # Nyquist frequency (phase exactly -180) counts as a crossing.
+        wrapped = (phase + 180) / 360
+        wrapped = np.where(np.abs(wrapped - np.round(wrapped)) < 1e-9, np.round(wrapped) - 1e-9, wrapped)
+        crossings = np.nonzero(np.floor(wrapped[:-1]) != np.floor(wrapped[1:]))[0]
+        if len(crossings):
+            k = crossings[0]
+            target = np.floor(max(wrapped[k], wrapped[k + 1]))
+            f = (target - wrapped[k]) / (wrapped[k + 1] - wrapped[k])
+            gain_frequency = w[k] + f * (w[k + 1] - w[k])
+            gain = 10 ** (-(magnitude[k] + f * (magnitude[k + 1] - magnitude[k])) / 20)
+
+        margin, phase_frequency = np.inf, np.nan
+        crossings = np.nonzero((magnitude[:-1] >= 0) & (magnitude[1:] < 0))[0]
+        if len(crossings):
+            k = crossings[0]
+            f = magnitude[k] / (magnitude[k] - magnitude[k + 1])
+            phase_frequency = w[k] + f * (w[k + 1] - w[k])
+            margin = 180 + phase[k] + f * (phase[k + 1] - phase[k])
+            margin = (margin + 180) % 360 - 180
+        return Margins(float(gain), float(gain_frequency), float(margin), float(phase_frequency))
+
+    def closed_loop(self):
+        """
+        (A, B): closed-loop state matrix and reference input over one control
+        period. The state is the plant's, followed by the PID's error sum when i
+        is nonzero and its last error when d is nonzero.
+        """
+        p, i, d, dt = self.pid.p, self.pid.i, self.pid.d, self.pid_dt
+        k = p + i * dt + d / dt
+        C, Ad, Bd = self.C, self.Ad, self.Bd
+        n = len(Bd)
+        rows = [np.hstack((Ad - k * np.outer(Bd, C), np.zeros((n, 2))))]
+        inputs = [k * Bd]
+        rows[0][:, n] = i * Bd
+        rows[0][:, n + 1] = -d / dt * Bd
+        rows.append(np.hstack((-dt * C, [1, 0])))
+        inputs.append([dt])
+        rows.append(np.hstack((-C, [0, 0])))
+        inputs.append([1])
+        A, B = np.vstack(rows), np.concatenate(inputs)
+        keep = list(range(n)) + ([n] if i != 0 else []) + ([n + 1] if d != 0 else [])
+        return A[np.ix_(keep, keep)], B[keep]
+
+    def poles(self):
+        return np.linalg.eigvals(self.closed_loop()[0])
+
+    @property
+    def stable(self):
+        return bool(np.all(np.abs(self.poles()) < 1 - 1e-12))
+
+
+def main():
+    from disturbedspeedpid import DisturbedSpeedSimulation
+
+    sim = DisturbedSpeedSimulation()
+    sim.simulate()
+    model = LinearModel.of(sim, pid_dt=sim.step)
+    print(f'operating point: {model.velocity} rad/s at power {model.power:.3f}')
+    margins = model.margins()
+    print(f'gain margin {margins.gain:.3f} at {margins.gain_frequency:.2f} rad/s, '
+          f'phase margin {margins.phase:.1f} deg at {margins.phase_frequency:.2f} rad/s')
+    print('closed-loop poles:', np.round(model.poles(), 4))
+    print('stable:', model.stable)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import bench
+
+
+def test_temporaries_count_as_allocations():
+    # Motor.torque builds NumPy scalars on every call and keeps none of them
+    result = bench.measure(bench.MICRO['Motor.torque'], repeat=1)
+    assert result['allocated_bytes_per_step'] > 0
+    assert result['retained_blocks_per_step'] < 0.01
@@ -0,0 +1,29 @@
+import cache
+from disturbedspeedpid import DisturbedSpeedSimulation
+from positionpid import PositionSimulation
+
+
+def test_key_follows_gains_and_motor(tmp_path):
+    store = cache.ResultCache(str(tmp_path))
+    for cls in (PositionSimulation, DisturbedSpeedSimulation):
+        base = store.key(cls())
+        for change in (lambda s: setattr(s.pid, 'p', s.pid.p + 0.1),
+                       lambda s: setattr(s.motor, 'stall_torque', s.motor.stall_torque * 2),
+                       lambda s: setattr(s.motor, 'max_vel', s.motor.max_vel + 1)):
+            sim = cls()
+            change(sim)
+            assert store.key(sim) != base
+        assert store.key(cls()) == base
+
+
+def test_changed_gain_is_not_served_from_cache(tmp_path):
+    store = cache.ResultCache(str(tmp_path))
+    first = PositionSimulation()
+    first.cache = store
+    first.simulate()
+    second = PositionSimulation()
+    second.pid.p *= 2
+    second.cache = store
+    second.simulate()
+    assert store.hits == 0
+    assert (first.flywheel.positions != second.flywheel.positions).any()
@@ -0,0 +1,13 @@
+from functools import partial
+
+from checkpoint import _scale_disturbance, checkpoint
+from disturbedspeedpid import DisturbedSpeedSimulation
+from tuner import velocity_iae
+
+
+def test_fork_many_in_processes_matches_in_process():
+    sim = DisturbedSpeedSimulation()
+    sim.set_timing(duration=8)
+    base = checkpoint(sim, 5)
+    variants = [partial(_scale_disturbance, s) for s in (0.5, 2)]
+    assert base.fork_many(variants, velocity_iae, processes=2) == base.fork_many(variants, velocity_iae)
@@ -0,0 +1,57 @@
+import pytest
+
+import control
+from models import Flywheel
+
+
+class _NoTargets(control.TargetedSimulation):
+
+    def __init__(self):
+        super().__init__(1)
+
+    def init(self):
+        self.add_flywheel(Flywheel(0.01))
+
+    def loop(self, i, t, dt):
+        pass
+
+
+class _StepTarget(_NoTargets):
+
+    def get_target(self, i, t, dt):
+        return 1
+
+
+class _TimeTargets(_NoTargets):
+
+    def get_targets(self, frames):
+        return frames
+
+
+def test_targets_are_required_at_construction():
+    with pytest.raises(TypeError):
+        _NoTargets()
+    _StepTarget().simulate()
+    _TimeTargets().simulate()
+
+
+def test_control_faster_than_physics_is_rejected():
+    sim = _StepTarget()
+    with pytest.raises(ValueError):
+        sim.set_timing(control_frequency=5000)
+    assert sim.control_frequency == 100 and sim.steps_per_control == 10
+    sim.set_timing(step=0.0001, control_frequency=5000)
+    assert sim.steps_per_control == 2
+    sim.simulate()
+
+
+def test_disturbed_speed_uses_the_simulation_step():
+    from disturbedspeedpid import DisturbedSpeedSimulation
+
+    sim = DisturbedSpeedSimulation()
+    sim.set_timing(duration=2, step=0.0005)
+    steps = set()
+    push_error = sim.pid.push_error
+    sim.pid.push_error = lambda error, dt: steps.add(dt) or push_error(error, dt)
+    sim.simulate()
+    assert steps == {0.0005}
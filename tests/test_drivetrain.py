@@ -0,0 +1,60 @@
+import numpy as np
+
+import control
+from drivetrain import Drivetrain, DrivetrainSimulation
+from models import Flywheel, Motor
+from recording import Recorder, Recording, StreamingHistory
+
+
+def _power(t):
+    return 1 if t < 1 else -0.4 if t < 2 else 0
+
+
+class _Single(control.Simulation):
+
+    def __init__(self):
+        super().__init__(3)
+
+    def init(self):
+        self.flywheel = self.add_flywheel(Flywheel(0.01, kin_fric=0.01, stat_fric=0.02))
+        self.motor = self.add_motor(Motor(self.flywheel, 556, 2.42, deadzone=0.1))
+
+    def loop(self, i, t, dt):
+        self.motor.power = _power(t)
+
+
+class _SingleDrivetrain(DrivetrainSimulation):
+
+    def __init__(self):
+        super().__init__(3)
+
+    def init(self):
+        self.drivetrain = Drivetrain()
+        body = self.drivetrain.add_body(0.01, kin_fric=0.01, stat_fric=0.02)
+        self.drivetrain.add_motor(body, 556, 2.42, deadzone=0.1)
+        self.add_drivetrain(self.drivetrain)
+
+    def loop(self, i, t, dt):
+        self.drivetrain.power = _power(t)
+
+
+def test_single_body_matches_flywheel_and_motor():
+    reference = _Single()
+    reference.simulate()
+    sim = _SingleDrivetrain()
+    sim.simulate()
+    assert np.array_equal(sim.drivetrain.velocities[:, 0], reference.flywheel.velocities)
+    assert np.array_equal(sim.drivetrain.positions[:, 0], reference.flywheel.positions)
+    assert np.array_equal(sim.drivetrain.torques[:, 0], reference.motor.torques)
+
+
+def test_motor_history_is_recorded(tmp_path):
+    reference = _SingleDrivetrain()
+    reference.simulate()
+    sim = _SingleDrivetrain()
+    sim.recorder = Recorder(str(tmp_path), chunk=512)
+    sim.simulate()
+    assert isinstance(sim.drivetrain.motor_history, StreamingHistory)
+    recorded = Recording(str(tmp_path)).flywheels[0]
+    assert np.array_equal(recorded.torques, reference.drivetrain.torques)
+    assert np.array_equal(recorded.velocities, reference.drivetrain.velocities)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import checkpoint
+import integrators
+from disturbedspeedpid import DisturbedSpeedSimulation
+from positionpid import PositionSimulation
+from quarticpositionpid import QuarticPositionSimulation
+
+
+def _torque_at(motor, velocities, powers):
+    power = (1 - motor.deadzone) * (np.abs(powers) - 1) + 1
+    return np.sign(powers) * np.maximum(0, power - np.abs(velocities) / motor.max_vel) * motor.stall_torque
+
+
+def test_torques_are_sampled_like_euler():
+    # Motor.step records the torque at the velocity the step ended with
+    for integrator in (integrators.EulerIntegrator(), integrators.AnalyticIntegrator()):
+        sim = QuarticPositionSimulation()
+        sim.integrator = integrator
+        sim.simulate()
+        expected = _torque_at(sim.motor, sim.flywheel.velocities, sim.motor.powers)
+        assert np.allclose(sim.motor.torques, expected, atol=1e-12)
+
+
+def test_analytic_stays_close_to_euler():
+    euler = QuarticPositionSimulation()
+    euler.simulate()
+    analytic = QuarticPositionSimulation()
+    analytic.integrator = integrators.AnalyticIntegrator()
+    analytic.simulate()
+    assert np.max(np.abs(euler.flywheel.positions - analytic.flywheel.positions)) < 0.05
+
+
+class _Limited(integrators.AnalyticIntegrator):
+    MAX_SEGMENTS = 1
+
+
+def test_running_out_of_segments_raises():
+    sim = PositionSimulation()
+    sim.integrator = _Limited()
+    with pytest.raises(RuntimeError):
+        sim.simulate()
+
+
+def _velocities(integrator, cls=DisturbedSpeedSimulation):
+    sim = cls()
+    sim.integrator = integrator
+    sim.simulate()
+    return sim.flywheel.velocities
+
+
+def test_adaptive_runs_are_reproducible():
+    integrator = integrators.AdaptiveIntegrator()
+    assert np.array_equal(_velocities(integrator), _velocities(integrator))
+    assert np.array_equal(_velocities(integrator), _velocities(integrators.AdaptiveIntegrator()))
+
+
+def test_adaptive_forks_match_the_full_run():
+    full = _velocities(integrators.AdaptiveIntegrator())
+    sim = DisturbedSpeedSimulation()
+    sim.integrator = integrators.AdaptiveIntegrator()
+    # Between control ticks; the checkpoint falls back to the tick before
+    fork = checkpoint.checkpoint(sim, 5.005).fork()
+    assert np.array_equal(fork.flywheel.velocities, full)
+
+
+def test_adaptive_running_out_of_steps_raises():
+    sim = QuarticPositionSimulation()
+    sim.integrator = integrators.AdaptiveIntegrator(max_steps=1)
+    with pytest.raises(RuntimeError):
+        sim.simulate()
@@ -0,0 +1,32 @@
+import matplotlib
+import numpy as np
+
+import liveplot
+from positionpid import PositionSimulation
+
+
+def test_envelope_grows_incrementally():
+    rng = np.random.default_rng(0)
+    x = np.arange(1000.0)
+    y = rng.normal(size=1000)
+    envelope = liveplot._Envelope(7)
+    for n in (0, 3, 100, 101, 640, 1000):
+        ex, ey = envelope.extend(x, y[:n])
+    whole = 1000 // 7 * 7
+    body = y[:whole].reshape(-1, 7)
+    assert np.array_equal(np.sort(ey[:2 * len(body)].reshape(-1, 2), axis=1),
+                          np.stack((body.min(axis=1), body.max(axis=1)), axis=1))
+    assert np.array_equal(ey[2 * len(body):], y[whole:])
+    assert np.all(np.diff(ex) >= 0)
+
+
+def test_live_run_matches_plain_run():
+    matplotlib.use('Agg')
+    plain = PositionSimulation()
+    plain.simulate()
+    sim = PositionSimulation()
+    view = liveplot.LiveView(sim, interactive=True)
+    view.simulate(block=False)
+    assert np.array_equal(sim.flywheel.positions, plain.flywheel.positions)
+    # The run advances in slices of a frame period or more, not per control period
+    assert view.frames_drawn < sim.cycles // sim.steps_per_control // 10
@@ -0,0 +1,14 @@
+import numpy as np
+
+from mathutils import Spline
+
+
+def test_array_path_matches_scalar_path():
+    xs = np.array([[-1, 0, 0.3, 1.5], [2, 3.7, 4, 9]])
+    for spline in (Spline(0, 1, 5, 2, 1), Spline(0, 2, tangents=(1, -1)), Spline(5)):
+        for evaluate in (spline, spline.derivative, spline.second_derivative):
+            values = evaluate(xs)
+            assert values.shape == xs.shape
+            expected = [[evaluate(float(x)) for x in row] for row in xs]
+            assert np.allclose(values, expected)
+            assert np.allclose(evaluate(xs[0, 2:3]), [evaluate(0.3)])
@@ -0,0 +1,23 @@
+import numpy as np
+
+import montecarlo
+
+
+def test_envelope_grows_to_take_in_later_chunks():
+    rng = np.random.default_rng(0)
+    first = rng.normal(0, 1, (200, 3))
+    later = rng.normal(5, 3, (200, 3))
+    envelope = montecarlo.PercentileEnvelope(3, -3, 3, bins=256)
+    envelope.add(first)
+    envelope.add(later)
+    runs = np.vstack([first, later])
+    assert (envelope.counts.sum(axis=1) == len(runs)).all()
+    width = (envelope.high - envelope.low) / envelope.bins
+    for q in (5, 50, 95):
+        assert np.allclose(envelope.percentile(q), np.percentile(runs, q, axis=0), atol=width)
+
+
+def test_normal_draws_stay_positive():
+    rng = np.random.default_rng(0)
+    assert (montecarlo.sample(('normal', 0.01, 0.02), rng, 10000) > 0).all()
+    assert all(montecarlo.sample(('normal', 0.01, 0.02), rng) > 0 for _ in range(1000))
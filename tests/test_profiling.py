@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+from positionpid import PositionSimulation
+from profiling import PhaseProfiler
+
+
+class _Failing(PositionSimulation):
+
+    def loop(self, i, t, dt):
+        if i >= 500:
+            raise RuntimeError('controller failed')
+        super().loop(i, t, dt)
+
+
+def _patched(sim):
+    patched = {sim: ('raw_loop', 'loop'), sim.integrator: ('solve',)}
+    patched.update((model, ('step',)) for model in sim.flywheels + sim.motors)
+    patched.update((model.history, ('append', 'extend')) for model in sim.flywheels + sim.motors)
+    patched[sim.target_history] = ('append',)
+    return [name for obj, names in patched.items() for name in names if name in vars(obj)]
+
+
+def test_failed_run_is_unpatched():
+    sim = _Failing()
+    sim.profiler = PhaseProfiler(out=io.StringIO())
+    with pytest.raises(RuntimeError):
+        sim.simulate()
+    assert _patched(sim) == []
+    assert sim.profiler.calls['loop'] > 0
+
+
+def test_attached_restores_on_error():
+    sim = _Failing()
+    sim.start()
+    profiler = PhaseProfiler(report=False)
+    with pytest.raises(RuntimeError):
+        with profiler.attached(sim):
+            sim.advance()
+    assert _patched(sim) == []
+    sim.finish()
+
+
+def test_instance_methods_are_put_back():
+    sim = PositionSimulation()
+    loop = sim.loop
+    sim.loop = lambda i, t, dt: loop(i, t, dt)
+    custom = sim.loop
+    sim.profiler = PhaseProfiler(out=io.StringIO())
+    sim.simulate()
+    assert sim.loop is custom
+    del sim.loop
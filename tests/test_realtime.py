@@ -0,0 +1,47 @@
+import numpy as np
+
+from disturbedspeedpid import DisturbedSpeedSimulation
+from quarticpositionpid import QuarticPositionSimulation
+from realtime import RealtimeRunner, TickStats
+
+
+def test_dropped_ticks_still_run_all_physics():
+    for cls in (DisturbedSpeedSimulation, QuarticPositionSimulation):
+        reference = cls()
+        reference.simulate()
+        sim = cls()
+        stats = RealtimeRunner(sim, speed=1000, drop_late=True).simulate()
+        assert stats.skipped > 0
+        assert len(sim.flywheel.velocities) == len(reference.flywheel.velocities) == sim.cycles
+        assert len(sim.motor.powers) == sim.cycles
+        assert np.array_equal(sim.targets, reference.targets)
+        assert stats.summary()
+
+
+def test_without_drops_matches_simulate():
+    reference = DisturbedSpeedSimulation()
+    reference.set_timing(duration=1)
+    reference.simulate()
+    sim = DisturbedSpeedSimulation()
+    sim.set_timing(duration=1)
+    stats = RealtimeRunner(sim, speed=1000, drop_late=False).simulate()
+    assert stats.skipped == 0
+    assert np.array_equal(sim.flywheel.velocities, reference.flywheel.velocities)
+
+
+def test_summary_without_ticks():
+    assert '0 run' in TickStats(0.01).summary()
+
+
+def test_recorded_run_crosses_windows(tmp_path):
+    from recording import Recorder, Recording
+
+    reference = DisturbedSpeedSimulation()
+    reference.set_timing(duration=3)
+    reference.simulate()
+    sim = DisturbedSpeedSimulation()
+    sim.set_timing(duration=3)
+    sim.recorder = Recorder(str(tmp_path), chunk=1000)
+    RealtimeRunner(sim, speed=1000, drop_late=False).simulate()
+    recording = Recording(sim.recorder.directory)
+    assert np.array_equal(recording.flywheels[0].velocities, reference.flywheel.velocities)
@@ -0,0 +1,65 @@
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from disturbedspeedpid import DisturbedSpeedSimulation
+from integrators import AnalyticIntegrator
+from quarticpositionpid import QuarticPositionSimulation
+from recording import META, Recorder, Recording
+
+
+def _peak(cls, duration, directory):
+    sim = cls()
+    sim.set_timing(duration=duration)
+    sim.recorder = Recorder(str(directory), chunk=4096)
+    tracemalloc.start()
+    try:
+        sim.simulate()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_does_not_grow_with_duration(tmp_path):
+    for cls in (QuarticPositionSimulation, DisturbedSpeedSimulation):
+        short = _peak(cls, 20, tmp_path / f'{cls.__name__}20')
+        long = _peak(cls, 80, tmp_path / f'{cls.__name__}80')
+        assert long < short * 1.2
+
+
+def test_recording_matches_memory(tmp_path):
+    cases = [(QuarticPositionSimulation, None, 1000), (DisturbedSpeedSimulation, None, 1000),
+             (DisturbedSpeedSimulation, AnalyticIntegrator, 1005)]
+    for cls, integrator, chunk in cases:
+        reference = cls()
+        sim = cls()
+        if integrator is not None:
+            reference.integrator = integrator()
+            sim.integrator = integrator()
+        reference.simulate()
+        sim.recorder = Recorder(str(tmp_path / f'{cls.__name__}{chunk}'), chunk=chunk)
+        sim.simulate()
+        recording = Recording(sim.recorder.directory)
+        assert np.array_equal(recording.flywheels[0].velocities, reference.flywheel.velocities)
+        assert np.array_equal(recording.motors[0].torques, reference.motor.torques)
+        assert np.array_equal(recording.targets, reference.targets)
+
+
+class _Failing(QuarticPositionSimulation):
+
+    def loop(self, i, t, dt):
+        if t > 1:
+            raise RuntimeError('controller failed')
+        super().loop(i, t, dt)
+
+
+def test_recording_is_closed_on_error(tmp_path):
+    sim = _Failing()
+    sim.recorder = Recorder(str(tmp_path), chunk=256)
+    with pytest.raises(RuntimeError):
+        sim.simulate()
+    assert os.path.exists(tmp_path / META)
+    recording = Recording(str(tmp_path))
+    assert 1000 < len(recording.flywheels[0].positions) < sim.cycles
@@ -0,0 +1,11 @@
+import numpy as np
+
+import render
+
+
+def test_render_many_keeps_job_order(tmp_path):
+    frames = np.linspace(0, 1, 11)
+    series = {'position': frames, 'velocity': frames, 'power': frames, 'torque': frames}
+    jobs = [render.RenderJob(str(tmp_path / f'{k}.png'), 'vel', str(k), frames, series)
+            for k in range(5)]
+    assert render.render_many(jobs, processes=2) == [j.path for j in jobs]
@@ -0,0 +1,63 @@
+import numpy as np
+
+import control
+from models import Flywheel, Motor, PID
+from stability import LinearModel
+
+VELOCITY = 100
+
+
+class _SmallStep(control.TargetedSimulation):
+    """A PI velocity loop started in equilibrium at VELOCITY, with the target `delta` above it."""
+
+    tracks = 'vel'
+
+    def __init__(self, p, i, delta):
+        super().__init__(1)
+        self.pid = PID(p, i)
+        self.delta = delta
+
+    def get_target(self, i, t, dt):
+        return VELOCITY + self.delta
+
+    def init(self):
+        # Friction keeps the equilibrium power above back-EMF, away from the motor's kink at zero torque
+        self.flywheel = self.add_flywheel(Flywheel(0.01, kin_fric=0.01))
+        self.motor = self.add_motor(Motor(self.flywheel, 556, 2.42))
+        self.flywheel.vel = VELOCITY
+        self.motor.power = self.flywheel.kin_fric / self.motor.stall_torque + VELOCITY / self.motor.max_vel
+        self.flywheel.apply_torque(self.motor.torque)
+        self.pid._sum = self.motor.power / self.pid.i
+
+    def loop(self, i, t, dt):
+        self.motor.power = self.pid.push_error(self.target - self.flywheel.vel, dt)
+
+
+def _responses(p, i, delta, ticks):
+    sim = _SmallStep(p, i, delta)
+    sim.simulate()
+    model = LinearModel.of(sim)
+    A, B = model.closed_loop()
+    x = np.zeros(len(B))
+    predicted = []
+    for _ in range(ticks):
+        x = A @ x + B * delta
+        predicted.append(model.C @ x[:len(model.C)])
+    # The velocity the controller reads at ticks 1, 2, ...
+    k = sim.steps_per_control
+    actual = sim.flywheel.velocities[k - 1:k * ticks:k] - VELOCITY
+    return model, np.array(predicted), actual
+
+
+def test_stable_gain_matches_simulation():
+    model, predicted, actual = _responses(0.05, 0.5, 1e-6, 90)
+    assert model.stable
+    assert np.allclose(actual, predicted, rtol=1e-3, atol=1e-4 * 1e-6)
+    assert abs(actual[-1] - 1e-6) < 0.1e-6
+
+
+def test_unstable_gain_matches_simulation():
+    model, predicted, actual = _responses(2, 1, 1e-9, 10)
+    assert not model.stable
+    assert np.allclose(actual, predicted, rtol=1e-3)
+    assert abs(actual[-1]) > 1000 * 1e-9
@@ -0,0 +1,109 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+
+import numpy as np
+
+import metrics
+from models import PID
+
+GAINS = ('p', 'i', 'd', 'f')
+
+TuneResult = namedtuple('TuneResult', ('score',) + GAINS)
+
+
+def position_iae(sim):
+    """Integrated absolute position error of a TargetedSimulation."""
+    return metrics.iae(sim.frames, sim.targets, sim.flywheel.positions)
+
+
+def velocity_iae(sim):
+    """Integrated absolute velocity error of a TargetedSimulation."""
+    return metrics.iae(sim.frames, sim.targets, sim.flywheel.velocities)
+
+
+def _evaluate(sim_factory, cost, gains):
+    sim = sim_factory()
+    sim.pid = PID(*gains)
+    sim.simulate()
+    return float(cost(sim))
+
+
+def _evaluate_chunk(args):
+    sim_factory, cost, chunk = args
+    return [_evaluate(sim_factory, cost, gains) for gains in chunk]
+
+
+def _grid(ranges):
+    return list(itertools.product(*(np.atleast_1d(ranges.get(g, 0)).tolist() for g in GAINS)))
+
+
+def sweep(sim_factory, cost, processes=None, **ranges):
+    """
+    Run sim_factory() once for every combination of the gain values in `ranges`
+    (keyword arguments p, i, d and f, each a scalar or a sequence) with its `pid`
+    replaced, and score each run with cost(sim). sim_factory and cost must be
+    picklable, i.e. defined at module level. Only the scores travel back from the
+    workers. Returns TuneResults sorted best (lowest score) first.
+    """
+    unknown = set(ranges) - set(GAINS)
+    assert not unknown, f'unknown gains: {sorted(unknown)}'
+    candidates = _grid(ranges)
+    scores = _map_scores(sim_factory, cost, candidates, processes)
+    return sorted((TuneResult(s, *g) for s, g in zip(scores, candidates)), key=lambda r: r.score)
+
+
+def _map_scores(sim_factory, cost, candidates, processes=None):
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(candidates) == 1:
+        return [_evaluate(sim_factory, cost, gains) for gains in candidates]
+
+    # A few chunks per worker keeps the pool busy without paying IPC per run
+    size = max(1, len(candidates) // (4 * processes))
+    chunks = [candidates[k:k + size] for k in range(0, len(candidates), size)]
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(_evaluate_chunk, ((sim_factory, cost, c) for c in chunks))
+        return [s for chunk in results for s in chunk]
+
+
+def tune(sim_factory, cost, rounds=3, points=5, shrink=0.5, processes=None, **ranges):
+    """
+    Coarse-to-fine search. Gains given as (low, high) are searched on a grid of
+    `points` values; after each round every range is narrowed by `shrink` around
+    the best candidate. Scalar gains are held fixed. Returns every scored
+    candidate, best first.
+    """
+    bounds = {g: tuple(r) for g, r in ranges.items() if np.ndim(r) == 1}
+    fixed = {g: r for g, r in ranges.items() if np.ndim(r) == 0}
+    results = []
+    for _ in range(rounds):
+        grid = dict(fixed)
+        grid.update((g, np.linspace(lo, hi, points)) for g, (lo, hi) in bounds.items())
+        results.extend(sweep(sim_factory, cost, processes, **grid))
+        results.sort(key=lambda r: r.score)
+        best = results[0]
+        for g, (lo, hi) in bounds.items():
+            half = (hi - lo) * shrink / 2
+            centre = min(max(getattr(best, g), lo + half), hi - half)
+            bounds[g] = (centre - half, centre + half)
+    return results
+
+
+def format_table(results, limit=10):
+    lines = ['{:>12} {:>9} {:>9} {:>9} {:>9}'.format('score', *GAINS)]
+    for r in results[:limit]:
+        lines.append('{:>12.6g} {:>9.4g} {:>9.4g} {:>9.4g} {:>9.4g}'.format(*r))
+    return '\n'.join(lines)
+
+
+def main():
+    from quarticpositionpid import QuarticPositionSimulation
+
+    results = tune(QuarticPositionSimulation, position_iae, rounds=2, points=4,
+                   p=(0.2, 1.5), i=1, d=(0.2, 1.5), f=0.15)
+    print(format_table(results))
+
+
+if __name__ == '__main__':
+    main()